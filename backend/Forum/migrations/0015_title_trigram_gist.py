@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Forum', '0014_alter_comment_parent'),
+        ('GameHub', '0042_title_trigram_gist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['title'], name='forum_title_trigram_gist_idx', opclasses=['gist_trgm_ops']),
+        ),
+    ]
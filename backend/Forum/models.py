@@ -2,7 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 from django.utils.text import slugify
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.contrib.postgres.search import SearchVectorField
 from django.contrib.postgres.search import SearchVector
 from django.db.models import Value
@@ -29,7 +29,8 @@ class ForumPost(models.Model):
 
     Meta:
         - Adds indexes on title and created_at for faster filtering and sorting.
-        - Uses a trigram GIN index on the title field for efficient fuzzy searching.
+        - Uses a trigram GIN index on the title field for fuzzy filtering and a GiST
+          one for nearest-title ordering.
         - Adds a GIN index on the search_vector for full-text search support.
     """
     POST_TYPE_CHOICES = [("game", 'Game'), ('general', 'General')]
@@ -55,6 +56,7 @@ class ForumPost(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['title', 'created_at']),
             GinIndex(fields=['title'], name='forum_title_trigram_idx', opclasses=['gin_trgm_ops']),
+            GistIndex(fields=['title'], name='forum_title_trigram_gist_idx', opclasses=['gist_trgm_ops']),
             GinIndex(fields=['search_vector'], name='forum_search_vector_idx'),
         ]
 
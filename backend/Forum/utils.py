@@ -1,7 +1,7 @@
 import hashlib
 from django.core.cache import cache
 from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
-from django.contrib.postgres.search import TrigramSimilarity
+from GameHub.search import fuzzy_search
 from django.core.paginator import Paginator
 from django.db.models import F
 from .models import ForumPost
@@ -49,7 +49,6 @@ def getPostList(posts,search_word,sort,type, page, user):
 
 
     sort_options = ["relevance","title", "created(asc)","created(desc)", "likes"]
-    search_threshold = 0.2
 
     # Ensures page number is valid
     try:
@@ -90,16 +89,8 @@ def getPostList(posts,search_word,sort,type, page, user):
             if (sort == "relevance"):
                 posts = posts.order_by("-rank")
         else:
-            # Fallback to Trigram
-            trigram_results = posts.objects.annotate(
-                similarity=TrigramSimilarity('title', search_word)
-            ).filter(
-                similarity__gt=search_threshold
-            )
-
-            posts = trigram_results
-            if (sort == "relevance"):
-                posts = posts.order_by("-similarity")
+            # Fallback to an index-backed trigram search, closest titles first
+            posts = fuzzy_search(posts, search_word)
    
 
     # Filters by games that contain the selected genre
@@ -167,8 +158,6 @@ def getPostSuggestions(search_word):
     Returns:
         QuerySet: A list of max 5 posts sorted by there rank or similarity.
     """
-    search_threshold = 0.2
-
     # Search using postgres full text search if it returns results
     # else it uses a trigram similiarity search instead
     if search_word:
@@ -184,13 +173,7 @@ def getPostSuggestions(search_word):
         if fulltext_results.exists():
             return fulltext_results
         else:
-            # Fallback to TrigramSimilarity
-            trigram_results = ForumPost.objects.annotate(
-                similarity=TrigramSimilarity('title', search_word)
-            ).filter(
-                similarity__gt=search_threshold
-            ).order_by('-similarity')[:5]
-
-            return trigram_results
+            # Fallback to the 5 nearest titles from the trigram GiST index
+            return fuzzy_search(ForumPost.objects.all(), search_word)[:5]
     else:
         return []
\ No newline at end of file
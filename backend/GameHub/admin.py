@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Token, Game, Genre, Video, Screenshot, Profile, PasswordRecoveryToken
+from .models import Token, Game, Genre, Video, Screenshot, Profile, PasswordRecoveryToken, IngestionRun
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin
 
@@ -25,6 +25,9 @@ class VideoAdmin(admin.ModelAdmin):
 class GameAdmin(admin.ModelAdmin):
     search_fields = ['title']
 
+class IngestionRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mode', 'parent', 'started_at', 'finished_at', 'games_loaded', 'last_game_id')
+
 # Register your models
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
@@ -34,3 +37,4 @@ admin.site.register(Genre)
 admin.site.register(Video, VideoAdmin)
 admin.site.register(Screenshot, ScreenshotAdmin)
 admin.site.register(PasswordRecoveryToken)
+admin.site.register(IngestionRun, IngestionRunAdmin)
@@ -0,0 +1,220 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.core.cache import cache
+
+from .models import Game
+from .serializer import GetGamesSerializer
+
+
+CATALOG_VERSION_KEY = "catalog_version"
+
+# Catalog caches are keyed by the catalog version, so they never serve
+# data older than the last catalog change and can live this long
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24 * 3
+
+# After this long a cached value is refreshed by one worker while the
+# others keep serving it
+CATALOG_FRESH_FOR = 60 * 60
+
+# How long a refresh lock is held at most, and how long a worker waits
+# for another worker's refresh of a missing value before computing it itself
+REFRESH_LOCK_TIMEOUT = 30
+REFRESH_WAIT = 2
+
+# Game cards are invalidated by id when a game is written, the timeout
+# only bounds a card refilled from a read that raced such a write
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version, initializing it if the cache lost it.
+
+    A lost version restarts from the current time in microseconds rather
+    than from 1, so it can never come back to a version that older cache
+    entries are still stored under.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Moves every catalog cache key to a new version, e.g. after games were written.
+
+    Entries under the old version are never read again and expire on their own.
+    """
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # The key was missing, a fresh version is just as new
+        return get_catalog_version()
+
+
+def catalog_key(name, *parts):
+    """
+    Builds a cache key for data derived from the game catalog.
+
+    Parameters:
+        name (str): What is cached, e.g. "search_games".
+        *parts: The parameters the cached value depends on.
+
+    Example:
+        catalog_key("search_games", search_word, genre, sort_option, page, perPage)
+    """
+    digest = hashlib.md5("_".join(str(part) for part in parts).encode()).hexdigest()
+    return f"{name}:v{get_catalog_version()}:{digest}"
+
+
+class SingleFlight:
+    """
+    Coalesces identical calls made concurrently within a process.
+
+    The first caller for a key runs the function, callers arriving while it
+    runs wait for and share its result (or its exception) instead of
+    running it again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+        return future.result()
+
+
+single_flight = SingleFlight()
+
+
+def get_or_compute(key, compute, timeout=CATALOG_CACHE_TIMEOUT, fresh_for=CATALOG_FRESH_FOR, cache_if=None):
+    """
+    Returns the cached value of `key`, computing it when needed without a stampede.
+
+    Values are stored with a soft expiry (`fresh_for`) well before the cache
+    drops them (`timeout`). Once a value goes stale, the worker that takes
+    the Redis refresh lock recomputes it while every other request keeps
+    getting the stale value. When there is no value at all, the other
+    workers wait briefly for the lock holder's result instead of all
+    querying Postgres. Within a process, identical misses share a single
+    computation.
+
+    Parameters:
+        key (str): The cache key.
+        compute (callable): Computes the value, called without arguments.
+        timeout (int): Seconds the cache keeps the value.
+        fresh_for (int): Seconds before the value is refreshed.
+        cache_if (callable): Optional predicate, a computed value it rejects is returned but not cached.
+
+    Returns:
+        The cached or freshly computed value.
+
+    Example:
+        data = get_or_compute(catalog_key("top_rated_list"), load_top_rated)
+    """
+    entry = cache.get(key)
+
+    if entry is not None:
+        if entry["fresh_until"] > time.time():
+            return entry["value"]
+
+        # Stale: one worker refreshes, everyone else serves the old value
+        if not cache.add(f"{key}:lock", 1, timeout=REFRESH_LOCK_TIMEOUT):
+            return entry["value"]
+        return single_flight.do(key, lambda: _refresh(key, compute, timeout, fresh_for, cache_if))
+
+    return single_flight.do(key, lambda: _fill(key, compute, timeout, fresh_for, cache_if))
+
+
+def _refresh(key, compute, timeout, fresh_for, cache_if):
+    """
+    Computes and stores a value, then releases the refresh lock the caller holds.
+    """
+    try:
+        value = compute()
+        if cache_if is None or cache_if(value):
+            cache.set(key, {"value": value, "fresh_until": time.time() + fresh_for}, timeout=timeout)
+        return value
+    finally:
+        cache.delete(f"{key}:lock")
+
+
+def _fill(key, compute, timeout, fresh_for, cache_if):
+    """
+    Computes a missing value, unless another worker already is and finishes in time.
+    """
+    if cache.add(f"{key}:lock", 1, timeout=REFRESH_LOCK_TIMEOUT):
+        return _refresh(key, compute, timeout, fresh_for, cache_if)
+
+    deadline = time.monotonic() + REFRESH_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["value"]
+
+        # Released without storing a value, it wasn't worth caching
+        if cache.get(f"{key}:lock") is None:
+            break
+
+    return compute()
+
+
+def card_key(pk):
+    return f"game_card:{pk}"
+
+
+def get_game_cards(pks):
+    """
+    Returns the serialized list cards of games, in the order of `pks`.
+
+    Cards are shared by every page and search showing the game. They are
+    read with one get_many and the misses loaded with a single id__in query.
+
+    Parameters:
+        pks (list): Game primary keys.
+
+    Returns:
+        list: The GetGamesSerializer data of each game that still exists.
+    """
+    keys = {card_key(pk): pk for pk in pks}
+    cards = {keys[key]: card for key, card in cache.get_many(list(keys)).items()}
+
+    missing = [pk for pk in pks if pk not in cards]
+    if missing:
+        games = Game.objects.filter(id__in=missing).only(*GetGamesSerializer.Meta.fields)
+        loaded = {game.pk: card for game, card in zip(games, GetGamesSerializer(games, many=True).data)}
+        cache.set_many({card_key(pk): card for pk, card in loaded.items()}, timeout=CARD_TIMEOUT)
+        cards.update(loaded)
+
+    return [cards[pk] for pk in pks if pk in cards]
+
+
+def forget_game_cards(pks):
+    """
+    Drops the cached cards of games that were written.
+    """
+    if pks:
+        cache.delete_many([card_key(pk) for pk in pks])
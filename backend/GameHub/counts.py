@@ -0,0 +1,36 @@
+from django.db import connection
+
+from .models import Game, GenreCount
+
+
+def estimate_game_count():
+    """
+    Returns the planner's estimate of the number of games, without scanning the table.
+
+    The estimate (pg_class.reltuples) is updated by ANALYZE and autovacuum,
+    the COPY import analyzes the game table when it finishes.
+
+    Returns:
+        int | None: The estimated number of games, None if the table was never analyzed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [f'"{Game._meta.db_table}"'])
+        row = cursor.fetchone()
+
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def get_genre_count(genre_id):
+    """
+    Returns the precomputed number of games of a genre, None if it has no GenreCount row yet.
+    """
+    return GenreCount.objects.filter(genre_id=genre_id).values_list("games", flat=True).first()
+
+
+def get_genre_counts():
+    """
+    Returns the precomputed number of games of every genre, by genre name.
+    """
+    return dict(GenreCount.objects.order_by("genre__name").values_list("genre__name", "games"))
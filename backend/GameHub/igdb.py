@@ -0,0 +1,632 @@
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.cache import cache
+from django.utils import timezone
+
+from .metrics import timed
+from .models import Token
+
+
+IGDB_GAMES_URL = "https://api.igdb.com/v4/games"
+IGDB_MULTIQUERY_URL = "https://api.igdb.com/v4/multiquery"
+IGDB_GENRES_URL = "https://api.igdb.com/v4/genres"
+TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+
+# IGDB allows 4 requests per second and up to 8 open requests per client
+IGDB_RATE_LIMIT = 4
+IGDB_MAX_CONCURRENCY = 8
+MULTIQUERY_MAX_QUERIES = 10
+
+PAGE_SIZE = 500
+DEFAULT_CONCURRENCY = 4
+
+GAME_FIELDS = "id, name, first_release_date, storyline, summary, cover.url, videos.video_id, screenshots.url, rating, genres.name, aggregated_rating, updated_at"
+
+# Multiquery pages name their genres from a reference set fetched once instead
+MULTIQUERY_GAME_FIELDS = GAME_FIELDS.replace("genres.name", "genres")
+GENRE_QUERY = 'query genres "genres" { fields name; limit 500; };'
+
+
+class IGDBError(Exception):
+    """
+    Raised when IGDB refuses a request or every retry of it failed.
+    """
+
+
+TOKEN_CACHE_KEY = "igdb_token"
+TOKEN_LOCK_KEY = "igdb_token_refresh_lock"
+
+# Tokens are refreshed this long before they expire
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+
+
+class TokenProvider:
+    """
+    Hands out the Twitch app access token used to call IGDB.
+
+    The token is kept in process memory and in the shared cache (Redis), so
+    the hot path costs no database query. The Token table is only read when
+    both are empty, e.g. after a cache flush.
+
+    A token is refreshed shortly before it expires. The refresh runs under a
+    cache lock so concurrent workers don't all hit the Twitch OAuth endpoint:
+    the others keep using the still-valid token or wait for the new one.
+    Every refresh prunes the token rows it replaces.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns a valid access token, refreshing it if it is about to expire.
+        """
+        token = self.token
+        if token and not self.expiring(token):
+            return token["access_token"]
+
+        with self.lock:
+            if self.token and not self.expiring(self.token):
+                return self.token["access_token"]
+
+            token = cache.get(TOKEN_CACHE_KEY) or self.from_database()
+            if token is None or self.expiring(token):
+                token = self.refresh(token)
+
+            self.token = token
+            return token["access_token"]
+
+    def expiring(self, token):
+        return token["expires_at"] - timezone.now() <= TOKEN_REFRESH_MARGIN
+
+    def from_database(self):
+        token = Token.objects.order_by("-expires_in").first()
+        if token is None:
+            return None
+
+        token = {"access_token": token.access_token, "expires_at": token.expires_in}
+        self.share(token)
+        return token
+
+    def share(self, token):
+        timeout = (token["expires_at"] - timezone.now()).total_seconds()
+        if timeout > 0:
+            cache.set(TOKEN_CACHE_KEY, token, timeout=timeout)
+
+    def refresh(self, current=None, wait=10):
+        """
+        Requests a new token from Twitch unless another worker already is.
+
+        Parameters:
+            current (dict): The token being replaced, still used while another
+                worker refreshes if it has not expired yet.
+            wait (int): Seconds to wait for another worker's refresh before
+                refreshing anyway.
+        """
+        locked = cache.add(TOKEN_LOCK_KEY, 1, timeout=30)
+        if not locked:
+            if current and current["expires_at"] > timezone.now():
+                return current
+
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.5)
+                token = cache.get(TOKEN_CACHE_KEY)
+                if token and not self.expiring(token):
+                    return token
+
+            # The other refresh may have ended without a token, take the lock
+            # if it's free, otherwise refresh without it
+            locked = cache.add(TOKEN_LOCK_KEY, 1, timeout=30)
+
+        try:
+            data = default_client().post(TWITCH_TOKEN_URL, data={
+                "client_id": os.getenv("CLIENT_ID"),
+                "client_secret": os.getenv("CLIENT_SECRET"),
+                "grant_type": "client_credentials"
+            }, limited=False).json()
+
+            expires_at = timezone.now() + timedelta(seconds=data.get("expires_in"))
+            token = Token.objects.create(
+                access_token=data.get("access_token"),
+                expires_in=expires_at,
+                token_type=data.get("token_type"),
+            )
+
+            # Only the newest token is ever used
+            Token.objects.exclude(pk=token.pk).delete()
+
+            token = {"access_token": token.access_token, "expires_at": expires_at}
+            self.share(token)
+            return token
+        finally:
+            # Never release a lock another worker holds
+            if locked:
+                cache.delete(TOKEN_LOCK_KEY)
+
+
+token_provider = TokenProvider()
+
+
+def igdb_headers():
+    """
+    Returns the headers authenticating a request to IGDB.
+    """
+    return {
+        "Client-ID": os.getenv("CLIENT_ID"),
+        "Authorization": f"Bearer {token_provider.get()}",
+    }
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to keep IGDB requests inside the
+    requests-per-second budget.
+
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    Every request takes one token and blocks until one is available.
+    """
+
+    def __init__(self, rate=IGDB_RATE_LIMIT, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available and consumes it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in shared memory, so every process of a
+    sharded import draws from the same IGDB budget.
+
+    It must be created before the worker processes start and handed to them
+    as a Process argument.
+    """
+
+    def __init__(self, rate=IGDB_RATE_LIMIT, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        # [tokens, updated], time.monotonic() is system-wide so it compares across processes
+        self.state = multiprocessing.Array("d", [self.capacity, time.monotonic()])
+        self.lock = self.state.get_lock()
+
+    @property
+    def tokens(self):
+        return self.state[0]
+
+    @tokens.setter
+    def tokens(self, value):
+        self.state[0] = value
+
+    @property
+    def updated(self):
+        return self.state[1]
+
+    @updated.setter
+    def updated(self, value):
+        self.state[1] = value
+
+
+# -------------------- Client --------------------
+
+def retry_after(response):
+    """
+    Returns the seconds a response's Retry-After header asks to wait, or None.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class IGDBClient:
+    """
+    HTTP client shared by everything that talks to IGDB and the Twitch token endpoint.
+
+    Requests go through one keep-alive Session whose connection pool is sized
+    for IGDB's open request limit, so pages reuse TLS connections instead of
+    paying a handshake each, and responses are gzip compressed.
+
+    Connection errors, timeouts, 5xx responses and 429s are retried with
+    exponential backoff and full jitter, waiting at least as long as a
+    Retry-After header asks. Other 4xx responses raise IGDBError at once.
+
+    Every attempt is reported to the registered hooks as
+    `hook(url, status, seconds)`, status being None for connection errors.
+
+    A Session must not cross a fork, so each process builds its own client
+    and only the rate limiter is shared between sharded processes.
+
+    Example:
+        client = IGDBClient()
+        client.add_hook(lambda url, status, seconds: print(url, status, f"{seconds:.2f}s"))
+        content = client.query(IGDB_GAMES_URL, "fields name; limit 10;")
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, limiter=None, pool_size=IGDB_MAX_CONCURRENCY, retries=5, backoff=1.0, max_backoff=60.0, timeout=30):
+        self.limiter = limiter or TokenBucket()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.hooks = []
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=pool_size))
+        self.session.headers["Accept-Encoding"] = "gzip"
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def backoff_delay(self, attempt):
+        """
+        Returns how long to wait before retry `attempt`, with full jitter so
+        concurrent requests that failed together don't retry together.
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def post(self, url, data, headers=None, limited=True, metrics=None):
+        """
+        Sends a POST request, retrying it until it succeeds or the retries run out.
+
+        Parameters:
+            url (str): The endpoint.
+            data (str | dict): The request body.
+            headers (dict): Extra request headers.
+            limited (bool): Take a token from the rate limiter before every attempt.
+            metrics (IngestionMetrics): Optional collector the request latency is added to.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            IGDBError: If the request was refused or every attempt failed.
+        """
+        # Only apicalypse query strings are shown in logs and errors, form
+        # bodies such as the Twitch token request carry the client secret
+        description = f"{url} {data[:120]!r}" if isinstance(data, str) else url
+
+        for attempt in range(self.retries + 1):
+            if limited:
+                self.limiter.acquire()
+
+            start = time.monotonic()
+            try:
+                with timed(metrics, "http"):
+                    response = self.session.post(url, data=data, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                response, status, error = None, None, e
+            else:
+                status, error = response.status_code, f"status {response.status_code}"
+
+            for hook in self.hooks:
+                hook(url, status, time.monotonic() - start)
+
+            if response is not None:
+                if response.ok:
+                    return response
+                if status not in self.RETRY_STATUSES:
+                    raise IGDBError(f"{description} returned {status}")
+
+            if attempt == self.retries:
+                break
+
+            delay = self.backoff_delay(attempt)
+            if response is not None:
+                delay = max(delay, retry_after(response) or 0)
+
+            print(f"Retrying {description} in {delay:.1f}s after {error} (attempt {attempt + 1}/{self.retries})")
+            time.sleep(delay)
+
+        raise IGDBError(f"Giving up on {description} after {self.retries + 1} attempts")
+
+    def query(self, url, body, metrics=None):
+        """
+        Sends one apicalypse query to IGDB, authenticated with the current token.
+
+        Returns:
+            bytes: The raw JSON body of the response.
+        """
+        return self.post(url, body, headers=igdb_headers(), metrics=metrics).content
+
+
+_default_client = None
+_default_client_pid = None
+
+
+def default_client():
+    """
+    Returns the IGDBClient of this process, created on first use.
+    """
+    global _default_client, _default_client_pid
+    if _default_client is None or _default_client_pid != os.getpid():
+        _default_client = IGDBClient()
+        _default_client_pid = os.getpid()
+    return _default_client
+
+
+def build_games_query(offset, where=None, limit=PAGE_SIZE, fields=GAME_FIELDS):
+    """
+    Builds the apicalypse query body for one page of the /games endpoint.
+
+    Results are sorted by id so offset windows stay stable between requests.
+
+    Parameters:
+        offset (int): The offset of the page.
+        where (str): Optional apicalypse filter, e.g. "updated_at > 1700000000".
+        limit (int): The page size.
+        fields (str): The fields requested for every game.
+    """
+    query = f"fields {fields};"
+    if where:
+        query += f" where {where};"
+    return query + f" sort id asc; limit {limit}; offset {offset};"
+
+
+def build_multiquery(offsets, where=None, genres=False):
+    """
+    Builds a /multiquery body fetching several pages of games in one request.
+
+    Each page is a result set named after its offset. Games only carry their
+    genre ids, `genres` adds the genre reference set used to name them.
+
+    Parameters:
+        offsets (list): The offsets of the pages.
+        where (str): Optional apicalypse filter applied to every page.
+        genres (bool): Also fetch every genre's id and name.
+    """
+    queries = [GENRE_QUERY] if genres else []
+    queries += [
+        f'query games "{offset}" {{ {build_games_query(offset, where, fields=MULTIQUERY_GAME_FIELDS)} }};'
+        for offset in offsets
+    ]
+    return "\n".join(queries)
+
+
+def decode_page(content):
+    """
+    Returns the games of a page, decoding it if it is still a raw body.
+    """
+    return content if isinstance(content, list) else json.loads(content)
+
+
+def is_empty_page(content):
+    """
+    Returns True if a page, raw or decoded, holds no games.
+    """
+    if isinstance(content, list):
+        return not content
+    return content.strip() in (b"", b"[]")
+
+
+def fetch_page(client, offset, where=None, metrics=None):
+    """
+    Fetches a single page of games from IGDB.
+
+    Returns:
+        bytes: The raw JSON body of the page, decoding is left to the caller.
+    """
+    return client.query(IGDB_GAMES_URL, build_games_query(offset, where), metrics=metrics)
+
+
+def fetch_max_game_id(client, where=None):
+    """
+    Returns the highest IGDB game id matching `where`, or None if no game matches.
+    """
+    body = "fields id; "
+    if where:
+        body += f"where {where}; "
+    body += "sort id desc; limit 1;"
+
+    games = json.loads(client.query(IGDB_GAMES_URL, body))
+    return games[0]["id"] if games else None
+
+
+def fetch_genre_names(client):
+    """
+    Returns the names of every genre IGDB knows.
+    """
+    genres = json.loads(client.query(IGDB_GENRES_URL, "fields name; limit 500;"))
+    return [genre["name"] for genre in genres]
+
+
+def fetch_multiquery(client, offsets, where=None, genres=False, metrics=None):
+    """
+    Fetches several pages of games from IGDB with a single /multiquery request.
+
+    Returns:
+        dict: The decoded result sets by name.
+    """
+    content = client.query(IGDB_MULTIQUERY_URL, build_multiquery(offsets, where, genres), metrics=metrics)
+    with timed(metrics, "decode"):
+        return {result["name"]: result["result"] for result in json.loads(content)}
+
+
+def unpack_multiquery(results, offsets, genre_names):
+    """
+    Splits a multiquery response back into pages in offset order.
+
+    Genre ids are expanded into the same {"id", "name"} objects a `genres.name`
+    expansion returns, so the pages look exactly like /games pages.
+
+    Parameters:
+        results (dict): The result sets returned by `fetch_multiquery`.
+        offsets (list): The offsets the request asked for.
+        genre_names (dict): Genre names by id, updated from the genre result set.
+    """
+    genre_names.update({genre["id"]: genre["name"] for genre in results.get("genres", [])})
+
+    pages = [results.get(str(offset), []) for offset in offsets]
+    for page in pages:
+        for game in page:
+            game["genres"] = [
+                {"id": genre_id, "name": genre_names[genre_id]}
+                for genre_id in game.get("genres", [])
+                if genre_id in genre_names
+            ]
+    return pages
+
+
+def fetch_game_pages(client=None, start_offset=0, concurrency=DEFAULT_CONCURRENCY, where=None, pages_per_request=1, metrics=None):
+    """
+    Fetches pages of games from IGDB keeping several offset windows in flight at once.
+
+    Pages are requested through a thread pool but yielded strictly in offset
+    order, so the caller can transform and insert them exactly as if they
+    had been fetched one at a time. Fetching stops at the first empty page
+    and a failed request raises IGDBError.
+
+    With `pages_per_request` above 1 every request is a /multiquery packing
+    that many offset windows, and the first one also carries the genre
+    reference set, cutting HTTP round trips and rate limit use accordingly.
+
+    Parameters:
+        client (IGDBClient): The client requests go through, and whose rate limiter
+            they share, defaults to the process's client.
+        start_offset (int): The offset of the first page.
+        concurrency (int): How many requests may be in flight at once (capped at IGDB's limit).
+        where (str): Optional apicalypse filter applied to every page.
+        pages_per_request (int): How many pages each request fetches (capped at IGDB's multiquery limit).
+        metrics (IngestionMetrics): Optional collector request and decode times are added to.
+
+    Yields:
+        bytes | list: The raw JSON body of each page, or the decoded games for multiquery pages.
+    """
+    concurrency = max(1, min(concurrency, IGDB_MAX_CONCURRENCY))
+    pages_per_request = max(1, min(pages_per_request, MULTIQUERY_MAX_QUERIES - 1))
+    client = client or default_client()
+    next_offset = start_offset
+    genre_names = {}
+    pending = deque()
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def submit():
+        nonlocal next_offset
+        if pages_per_request == 1:
+            pending.append((None, executor.submit(fetch_page, client, next_offset, where, metrics)))
+        else:
+            offsets = [next_offset + i * PAGE_SIZE for i in range(pages_per_request)]
+            genres = next_offset == start_offset
+            pending.append((offsets, executor.submit(fetch_multiquery, client, offsets, where, genres, metrics)))
+        next_offset += PAGE_SIZE * pages_per_request
+
+    try:
+        for _ in range(concurrency):
+            submit()
+
+        while pending:
+            offsets, future = pending.popleft()
+
+            # Multiquery responses are unpacked here rather than in the worker
+            # so the first one, holding the genres, is always unpacked first
+            if offsets is None:
+                pages = [future.result()]
+            else:
+                pages = unpack_multiquery(future.result(), offsets, genre_names)
+
+            for content in pages:
+                if is_empty_page(content):
+                    return
+                yield content
+
+            submit()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# -------------------- Record / Replay --------------------
+
+DUMP_PAGE_PATTERN = "page-{:06d}.ndjson.gz"
+DUMP_PAGE_NAME = re.compile(r"page-(\d+)\.ndjson\.gz")
+
+
+def record_pages(pages, directory):
+    """
+    Saves every page passing through as a gzip-compressed NDJSON file.
+
+    Each page becomes one file in `directory`, holding one game per line,
+    so a dump can be replayed with `read_dump_pages` without IGDB access.
+    Recording into an existing dump, e.g. when a recorded import is
+    resumed, numbers the new pages after the ones already there.
+
+    Parameters:
+        pages (iterable): Pages from `fetch_game_pages`.
+        directory (str): Where the dump is written, created if missing.
+
+    Yields:
+        bytes: The pages, unchanged.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    recorded = [int(match[1]) for match in map(DUMP_PAGE_NAME.fullmatch, os.listdir(directory)) if match]
+
+    for number, content in enumerate(pages, start=max(recorded, default=0) + 1):
+        with gzip.open(os.path.join(directory, DUMP_PAGE_PATTERN.format(number)), "wt", encoding="utf-8") as file:
+            for game in decode_page(content):
+                file.write(json.dumps(game, separators=(",", ":")) + "\n")
+        yield content
+
+
+def read_dump_pages(directory):
+    """
+    Replays a dump written by `record_pages`.
+
+    Pages are read back in recording order and re-assembled into the same
+    JSON array bodies IGDB returns, so they go through the normal transform
+    and insert path.
+
+    Parameters:
+        directory (str): The dump directory.
+
+    Yields:
+        bytes: The raw JSON body of each recorded page.
+    """
+    files = sorted(name for name in os.listdir(directory) if name.endswith(".ndjson.gz"))
+
+    for name in files:
+        with gzip.open(os.path.join(directory, name), "rb") as file:
+            lines = [line.rstrip(b"\n") for line in file if line.strip()]
+        yield b"[" + b",".join(lines) + b"]"
@@ -0,0 +1,680 @@
+import datetime
+import queue
+import threading
+import time
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db import connection, transaction
+from django.db.models import OuterRef
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version, forget_game_cards
+from .igdb import decode_page
+from .metrics import timed, profiled
+from .models import Game, Video, Screenshot, Genre
+
+
+download_batch_size = 500
+BATCH_SIZE = 10000
+
+# Items each pipeline queue holds before the stage feeding it has to wait
+QUEUE_DEPTH = 8
+
+GAME_UPDATE_FIELDS = ["title", "cover_image", "release", "storyline", "summary", "rating", "slug"]
+
+
+# -------------------- Transform --------------------
+
+def transform_game(game):
+    """
+    Converts one game returned by IGDB into the record written by `GameWriter`.
+
+    Parameters:
+        game (dict): A game from the IGDB /games endpoint.
+
+    Returns:
+        dict: The Game field values plus the game's genre names, video and screenshot urls.
+    """
+    game_id = game.get("id")
+    title = game.get('name')[:149]
+    release = game.get("first_release_date")
+    cover = game.get("cover")
+    storyline = game.get("storyline")[:6000] if game.get("storyline") else None
+    summary = game.get("summary")[:6000] if game.get("summary") else None
+    rating = game.get("rating")
+    critic_rating = game.get("aggregated_rating")
+
+    # Cover processing
+    cover = cover.get('url').replace('t_thumb', 't_cover_big') if cover else None
+
+    # Timestamp conversion
+    if release:
+        try:
+            release = timezone.make_aware(timezone.datetime.fromtimestamp(release))
+        except:
+            release = None
+
+    # Rating fallback
+    rating = round(rating / 10, 1) if rating else round(critic_rating / 10, 1) if critic_rating else None
+
+    safe_title = title[:80]
+    slug = slugify(f"{safe_title}-{game_id}")
+
+    return {
+        "game_id": game_id,
+        "title": title,
+        "cover_image": cover,
+        "release": release,
+        "storyline": storyline,
+        "summary": summary,
+        "rating": rating,
+        "slug": slug,
+        "genres": [genre.get("name") for genre in game.get("genres") or []],
+        "videos": [f"https://www.youtube.com/embed/{vid.get('video_id')}" for vid in game.get("videos") or []],
+        "screenshots": [shot.get("url") for shot in game.get("screenshots") or []],
+    }
+
+
+def transform_page(content, metrics=None):
+    """
+    Decodes one IGDB page and transforms every game on it.
+
+    Parameters:
+        content (bytes | list): The response body of a /games request, or the
+            already decoded games of a multiquery page.
+        metrics (IngestionMetrics): Optional collector decode and transform times are added to.
+
+    Returns:
+        list: The records of the games on the page.
+    """
+    with timed(metrics, "decode"):
+        games = decode_page(content)
+
+    with timed(metrics, "transform"):
+        return [transform_game(game) for game in games]
+
+
+# -------------------- Write --------------------
+
+def upsert_games(games, batch_size=download_batch_size):
+    """
+    Inserts games, updating the existing row instead when a game with the
+    same game_id is already stored (INSERT ... ON CONFLICT (game_id) DO UPDATE).
+
+    The games' genre_ids are written too, so they must already be set.
+
+    Parameters:
+        games (list): Unsaved Game instances, their primary keys are set afterwards.
+        batch_size (int): The number of games written per statement.
+    """
+    for i in range(0, len(games), batch_size):
+        Game.objects.bulk_create(
+            games[i:i + batch_size],
+            update_conflicts=True,
+            unique_fields=["game_id"],
+            update_fields=[*GAME_UPDATE_FIELDS, "genre_ids"],
+        )
+
+
+def upsert_media(model, games, srcs_by_game):
+    """
+    Makes the stored media of a batch of games match the imported urls.
+
+    Rows that are still current are left alone: only media the game no
+    longer has is deleted and only new urls are inserted, so re-importing
+    unchanged games leaves the media table untouched.
+
+    Parameters:
+        model (models.Model): Video or Screenshot.
+        games (list): Saved Game instances.
+        srcs_by_game (list): The media urls of each game, in the order of `games`.
+    """
+    wanted = {(game.pk, src) for game, srcs in zip(games, srcs_by_game) for src in srcs}
+    stored = {
+        (game_id, src): pk
+        for pk, game_id, src in model.objects.filter(game__in=games).values_list("pk", "game_id", "src")
+    }
+
+    stale = [pk for key, pk in stored.items() if key not in wanted]
+    if stale:
+        model.objects.filter(pk__in=stale).delete()
+
+    new = [model(game_id=game_id, src=src) for game_id, src in wanted if (game_id, src) not in stored]
+    model.objects.bulk_create(new, batch_size=download_batch_size, ignore_conflicts=True)
+
+
+class GenreResolver:
+    """
+    Resolves genre names to Genre ids for the ingestion loop.
+
+    The name -> id map is loaded once per import, genres that are not
+    stored yet are created together with a single bulk_create.
+    """
+
+    def __init__(self):
+        self.ids = dict(Genre.objects.values_list("name", "id"))
+
+    def resolve(self, names):
+        """
+        Returns the name -> id map, creating any of `names` that are missing.
+
+        Parameters:
+            names (iterable): Genre names used by the current batch.
+        """
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            created = Genre.objects.bulk_create([Genre(name=name) for name in missing])
+            self.ids.update({genre.name: genre.id for genre in created})
+        return self.ids
+
+
+def set_game_genres(games, genre_resolver):
+    """
+    Replaces the genre links of a batch of saved games.
+
+    The existing through rows are removed with one DELETE and the new ones
+    written with one bulk_create, instead of a `genres.set()` per game.
+
+    Parameters:
+        games (list): Saved Game instances with their genre names in `_genres`.
+        genre_resolver (GenreResolver): Resolver shared by the whole import.
+    """
+    GameGenre = Game.genres.through
+    genre_ids = genre_resolver.resolve(name for game in games for name in game._genres)
+
+    GameGenre.objects.filter(game__in=games).delete()
+    GameGenre.objects.bulk_create([
+        GameGenre(game_id=game.pk, genre_id=genre_ids[name])
+        for game in games
+        for name in set(game._genres)
+    ])
+
+
+def sync_genre_ids(game_pks):
+    """
+    Rewrites the genre_ids of games from their genre links, with one UPDATE.
+
+    Used when links change outside of the import writers, e.g. `genres.set()`
+    from the admin.
+
+    Parameters:
+        game_pks (iterable): Primary keys of the games whose links changed.
+    """
+    links = Game.genres.through.objects.filter(game_id=OuterRef("pk")).order_by("genre_id").values("genre_id")
+    Game.objects.filter(pk__in=list(game_pks)).update(genre_ids=ArraySubquery(links))
+
+
+class GameWriter:
+    """
+    Buffers transformed game records and upserts them `batch_size` at a time.
+
+    Each flush writes the games, their genre links and their media in one
+    transaction, so memory held by the writer never exceeds one batch. When
+    a run is given, the same transaction checkpoints it, so a crash either
+    loses the whole batch and its checkpoint or neither.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, run=None, metrics=None):
+        self.batch_size = batch_size
+        self.run = run
+        self.metrics = metrics
+        self.records = {}
+        self.genre_resolver = GenreResolver()
+        self.games_written = run.games_loaded if run else 0
+
+    def add(self, records):
+        """
+        Buffers records and flushes once a full batch has been collected.
+
+        Parameters:
+            records (list): Records produced by `transform_game`.
+
+        Returns:
+            bool: True if the call flushed a batch.
+        """
+        for record in records:
+            # A game repeated inside the batch keeps its latest copy
+            self.records[record["game_id"]] = record
+
+        if len(self.records) >= self.batch_size:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """
+        Upserts the buffered games, genre links and media then clears the buffer.
+        """
+        if not self.records:
+            return
+
+        records = list(self.records.values())
+
+        with transaction.atomic():
+            game_pks = self.write(records)
+            if self.run:
+                self.checkpoint(records)
+
+        # The batch is committed, catalog caches switch to it right away
+        forget_game_cards(game_pks)
+        bump_catalog_version()
+
+        self.games_written += len(records)
+        self.records.clear()
+        print(f"{self.games_written} games inserted so far...")
+
+        if self.metrics:
+            print(self.metrics.end_batch(len(records)))
+
+    def checkpoint(self, records):
+        """
+        Records the committed batch on the run.
+
+        Pages arrive sorted by IGDB id, so every game up to the highest id of
+        the batch has been written once the batch commits.
+        """
+        self.run.last_game_id = max(record["game_id"] for record in records)
+        self.run.games_loaded = self.games_written + len(records)
+        self.run.batches_committed += 1
+        self.run.save(update_fields=["last_game_id", "games_loaded", "batches_committed"])
+
+    def finish(self):
+        """
+        Writes whatever is left in the buffer at the end of an import.
+        """
+        self.flush()
+
+    def write(self, records):
+        """
+        Upserts one batch of records through the ORM.
+
+        Returns:
+            list: The primary keys of the written games.
+        """
+        # Genres are resolved first so the games' genre_ids are written by the upsert itself
+        genre_ids = self.genre_resolver.resolve(name for record in records for name in record["genres"])
+        games = [
+            Game(
+                **{field: record[field] for field in ["game_id", *GAME_UPDATE_FIELDS]},
+                genre_ids=sorted({genre_ids[name] for name in record["genres"]}),
+            )
+            for record in records
+        ]
+
+        with timed(self.metrics, "insert"):
+            upsert_games(games)
+
+        with timed(self.metrics, "m2m"):
+            for game, record in zip(games, records):
+                game._genres = record["genres"]  # temporarily attach genre names
+            set_game_genres(games, self.genre_resolver)
+
+        with timed(self.metrics, "media"):
+            upsert_media(Video, games, [record["videos"] for record in records])
+            upsert_media(Screenshot, games, [record["screenshots"] for record in records])
+
+        return [game.pk for game in games]
+
+
+def copy_value(value):
+    """
+    Formats a value for PostgreSQL's COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyStream:
+    """
+    File-like object feeding rows to COPY FROM STDIN as they are formatted,
+    so the payload is never built in memory as a whole.
+    """
+
+    def __init__(self, rows):
+        self.lines = ("\t".join(copy_value(value) for value in row) + "\n" for row in rows)
+        self.buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+
+        if size < 0:
+            data, self.buffer = self.buffer, ""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class CopyGameWriter(GameWriter):
+    """
+    Writes batches with PostgreSQL COPY instead of multi-row INSERTs.
+
+    Each batch is streamed into temporary staging tables with
+    COPY FROM STDIN and merged into the real tables with set-based SQL:
+    games are upserted on game_id, missing genres created, genre links
+    and genre_ids replaced, and media of the staged games upserted. The
+    loaded tables are analyzed at the end of the import so the planner sees
+    the new data.
+    """
+
+    STAGING_TABLES = {
+        "game_stage": "game_id integer, title text, cover_image text, release timestamptz, "
+                      "storyline text, summary text, rating double precision, slug text",
+        "genre_stage": "game_id integer, name text",
+        "video_stage": "game_id integer, src text",
+        "screenshot_stage": "game_id integer, src text",
+    }
+
+    def write(self, records):
+        """
+        Copies one batch into the staging tables and merges it.
+
+        Returns:
+            list: The primary keys of the written games.
+        """
+        game = Game._meta.db_table
+        genre = Genre._meta.db_table
+        game_genre = Game.genres.through._meta.db_table
+        video = Video._meta.db_table
+        screenshot = Screenshot._meta.db_table
+        game_columns = ", ".join(["game_id", *GAME_UPDATE_FIELDS])
+
+        with connection.cursor() as cursor:
+            # Staging tables only live for the batch's transaction
+            for table, columns in self.STAGING_TABLES.items():
+                cursor.execute(f"CREATE TEMP TABLE {table} ({columns}) ON COMMIT DROP")
+
+            with timed(self.metrics, "insert"):
+                self.copy(cursor, "game_stage", game_columns, (
+                    [record["game_id"], *(record[field] for field in GAME_UPDATE_FIELDS)] for record in records
+                ))
+                cursor.execute(f"""
+                    INSERT INTO "{game}" ({game_columns}, genre_ids)
+                    SELECT {game_columns}, '{{}}'::integer[] FROM game_stage
+                    ON CONFLICT (game_id) DO UPDATE SET
+                    {", ".join(f"{field} = EXCLUDED.{field}" for field in GAME_UPDATE_FIELDS)}
+                    RETURNING id
+                """)
+                game_pks = [row[0] for row in cursor.fetchall()]
+
+            with timed(self.metrics, "m2m"):
+                self.copy(cursor, "genre_stage", "game_id, name", (
+                    (record["game_id"], name) for record in records for name in set(record["genres"])
+                ))
+                cursor.execute(f"""
+                    INSERT INTO "{genre}" (name)
+                    SELECT DISTINCT s.name FROM genre_stage s
+                    WHERE NOT EXISTS (SELECT 1 FROM "{genre}" g WHERE g.name = s.name)
+                """)
+                cursor.execute(f"""
+                    DELETE FROM "{game_genre}" t
+                    USING "{game}" g, game_stage s
+                    WHERE t.game_id = g.id AND g.game_id = s.game_id
+                """)
+                cursor.execute(f"""
+                    INSERT INTO "{game_genre}" (game_id, genre_id)
+                    SELECT DISTINCT g.id, ge.id
+                    FROM genre_stage s
+                    JOIN "{game}" g ON g.game_id = s.game_id
+                    JOIN (SELECT name, min(id) AS id FROM "{genre}" GROUP BY name) ge ON ge.name = s.name
+                """)
+                # New games were inserted with no genre_ids, existing ones kept theirs
+                cursor.execute(f"""
+                    UPDATE "{game}" g
+                    SET genre_ids = ARRAY(
+                        SELECT t.genre_id FROM "{game_genre}" t WHERE t.game_id = g.id ORDER BY t.genre_id
+                    )
+                    FROM game_stage s
+                    WHERE g.game_id = s.game_id
+                """)
+
+            with timed(self.metrics, "media"):
+                self.copy(cursor, "video_stage", "game_id, src", (
+                    (record["game_id"], src) for record in records for src in record["videos"]
+                ))
+                self.copy(cursor, "screenshot_stage", "game_id, src", (
+                    (record["game_id"], src) for record in records for src in record["screenshots"]
+                ))
+
+                # Only media a game no longer has is deleted and only new
+                # urls inserted, unchanged rows are left alone
+                for table, stage in ((video, "video_stage"), (screenshot, "screenshot_stage")):
+                    cursor.execute(f"""
+                        DELETE FROM "{table}" m
+                        USING "{game}" g, game_stage s
+                        WHERE m.game_id = g.id AND g.game_id = s.game_id
+                        AND NOT EXISTS (
+                            SELECT 1 FROM {stage} v WHERE v.game_id = s.game_id AND v.src = m.src
+                        )
+                    """)
+                    cursor.execute(f"""
+                        INSERT INTO "{table}" (game_id, src)
+                        SELECT DISTINCT g.id, s.src FROM {stage} s JOIN "{game}" g ON g.game_id = s.game_id
+                        ON CONFLICT (game_id, src) DO NOTHING
+                    """)
+
+        return game_pks
+
+    def copy(self, cursor, table, columns, rows):
+        """
+        Streams rows into a staging table with COPY FROM STDIN.
+        """
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", CopyStream(rows))
+
+    def finish(self):
+        """
+        Writes the last batch then refreshes the planner statistics of the loaded tables.
+        """
+        self.flush()
+
+        with timed(self.metrics, "analyze"), connection.cursor() as cursor:
+            for model in (Game, Genre, Game.genres.through, Video, Screenshot):
+                cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+
+
+# -------------------- Pipeline --------------------
+
+_DONE = object()
+
+
+class StageStats:
+    """
+    Timing of one pipeline stage.
+
+    `starved` is time spent waiting for the upstream stage and `blocked` is
+    time spent waiting for room in the downstream queue, i.e. backpressure
+    from a slower stage further down the pipeline.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0
+        self.blocked = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.items} items, busy {self.busy:.1f}s, "
+            f"waiting for input {self.starved:.1f}s, blocked by downstream {self.blocked:.1f}s"
+        )
+
+
+class Pipeline:
+    """
+    Runs ingestion stages concurrently, connected by bounded queues.
+
+    Every stage except the sink runs on its own thread. A full queue makes the
+    stage feeding it wait, so memory is capped by the queue depths no matter
+    how large the catalog is. The sink runs on the calling thread so database
+    writes keep using its connection. Given a `profilers` list, every stage
+    thread runs under its own cProfile profiler, appended to the list.
+
+    Example:
+        pipeline = Pipeline()
+        pages = pipeline.source("fetch", fetch_game_pages(headers))
+        records = pipeline.stage("transform", transform_page, pages)
+        pipeline.sink("write", writer.add, records)
+    """
+
+    def __init__(self, depth=QUEUE_DEPTH, profilers=None):
+        self.depth = depth
+        self.profilers = profilers
+        self.stop = threading.Event()
+        self.threads = []
+        self.queues = []
+        self.stats = []
+        self.errors = []
+
+    def _queue(self):
+        q = queue.Queue(maxsize=self.depth)
+        self.queues.append(q)
+        return q
+
+    def _put(self, q, item, stats):
+        start = time.monotonic()
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        stats.blocked += time.monotonic() - start
+
+    def _get(self, q, stats):
+        start = time.monotonic()
+        item = _DONE
+        while not self.stop.is_set():
+            try:
+                item = q.get(timeout=0.5)
+                break
+            except queue.Empty:
+                continue
+        stats.starved += time.monotonic() - start
+        return item
+
+    def _start(self, name, target):
+        stats = StageStats(name)
+        self.stats.append(stats)
+        if self.profilers is not None:
+            target = profiled(target, self.profilers)
+        thread = threading.Thread(target=target, args=(stats,), name=f"ingest-{name}", daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def source(self, name, iterable):
+        """
+        Starts a stage that feeds the items of `iterable` into a new queue.
+
+        An error raised by the iterable ends the stream after the items already
+        produced, so they still reach the sink before the error is re-raised.
+
+        Returns:
+            Queue: The queue the items are written to.
+        """
+        outbox = self._queue()
+
+        def run(stats):
+            iterator = iter(iterable)
+            try:
+                while not self.stop.is_set():
+                    start = time.monotonic()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        stats.busy += time.monotonic() - start
+                    stats.items += 1
+                    self._put(outbox, item, stats)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                # Lets a generator source clean up, e.g. shut down its thread pool
+                if hasattr(iterator, "close"):
+                    iterator.close()
+            self._put(outbox, _DONE, stats)
+
+        self._start(name, run)
+        return outbox
+
+    def stage(self, name, func, inbox):
+        """
+        Starts a stage that applies `func` to every item of `inbox`.
+
+        Returns:
+            Queue: The queue the results are written to.
+        """
+        outbox = self._queue()
+
+        def run(stats):
+            try:
+                while True:
+                    item = self._get(inbox, stats)
+                    if item is _DONE:
+                        break
+                    start = time.monotonic()
+                    result = func(item)
+                    stats.busy += time.monotonic() - start
+                    stats.items += 1
+                    self._put(outbox, result, stats)
+            except Exception as e:
+                # Upstream stages cannot drain into a dead stage, so stop them all
+                self.errors.append(e)
+                self.stop.set()
+            self._put(outbox, _DONE, stats)
+
+        self._start(name, run)
+        return outbox
+
+    def sink(self, name, func, inbox):
+        """
+        Applies `func` to every item of `inbox` on the calling thread until the
+        stream ends, then re-raises the first error raised by any stage.
+        """
+        stats = StageStats(name)
+        self.stats.append(stats)
+
+        try:
+            while True:
+                item = self._get(inbox, stats)
+                if item is _DONE:
+                    break
+                start = time.monotonic()
+                func(item)
+                stats.busy += time.monotonic() - start
+                stats.items += 1
+        finally:
+            self.stop.set()
+            for thread in self.threads:
+                thread.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+    def status(self):
+        """
+        Returns how full each queue currently is.
+        """
+        return ", ".join(
+            f"{stats.name} queue {q.qsize()}/{self.depth}" for stats, q in zip(self.stats, self.queues)
+        )
+
+    def report(self):
+        """
+        Returns a line per stage with its work, starvation and backpressure times.
+        """
+        return "\n".join(str(stats) for stats in self.stats)
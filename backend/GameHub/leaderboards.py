@@ -0,0 +1,25 @@
+from .models import Leaderboard
+
+
+def get_leaderboard(board="all", board_key=0):
+    """
+    Returns the games of a leaderboard, best rated first.
+
+    Parameters:
+        board (str): "all", "genre" or "year".
+        board_key (int): The genre id or release year, 0 for "all".
+
+    Returns:
+        list: Game instances with their genres prefetched, empty for an unknown genre or year.
+
+    Example:
+        get_leaderboard("year", 2017)
+    """
+    entries = (
+        Leaderboard.objects
+        .filter(board=board, board_key=board_key)
+        .select_related("game")
+        .prefetch_related("game__genres")
+        .order_by("position")
+    )
+    return [entry.game for entry in entries]
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from GameHub.suggestions import build_suggestion_index
+
+class Command(BaseCommand):
+    help = 'Rebuilds the game title suggestion index file from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Where to write the index (default settings.SUGGESTION_INDEX_PATH)",
+        )
+
+    def handle(self, *args, **kwargs):
+        games = build_suggestion_index(kwargs["path"])
+        self.stdout.write(f"Suggestion index rebuilt with {games} games")
@@ -1,9 +1,94 @@
-
-from django.core.management.base import BaseCommand
-from GameHub.utils import loadGames 
+from django.core.management.base import BaseCommand, CommandError
+from GameHub.utils import getGenreCounts, loadGames, refresh_materialized_view
+from GameHub.igdb import DEFAULT_CONCURRENCY
+from GameHub.suggestions import build_suggestion_index
+from GameHub.cache import bump_catalog_version
+from GameHub.models import GenreCount, Leaderboard
 
 class Command(BaseCommand):
-    help = 'Runs the authenticate function from utils.py'
+    help = 'Loads games from IGDB into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help="Number of IGDB pages fetched at once (rate limited to IGDB's requests-per-second budget)",
+        )
+        parser.add_argument(
+            "--multiquery",
+            type=int,
+            default=1,
+            metavar="PAGES",
+            help="Pack this many 500-game pages into each IGDB /multiquery request (up to 9)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Split a new import into this many IGDB id ranges, each imported by its own process",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only fetch games IGDB updated since the last finished import, or every game the first time",
+        )
+        parser.add_argument(
+            "--method",
+            choices=["orm", "copy"],
+            default="orm",
+            help="Write batches with ORM bulk inserts or COPY into staging tables merged with SQL",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the latest unfinished import right after its last committed batch",
+        )
+        parser.add_argument(
+            "--record",
+            metavar="DIR",
+            help="Also save every fetched IGDB page to DIR as gzip-compressed NDJSON",
+        )
+        parser.add_argument(
+            "--from-dump",
+            metavar="DIR",
+            help="Import a dump recorded with --record instead of fetching from IGDB",
+        )
+        parser.add_argument(
+            "--profile",
+            nargs="?",
+            const="load_games.prof",
+            metavar="PATH",
+            help="Write a cProfile dump of the import to PATH (default load_games.prof) and print a summary",
+        )
 
     def handle(self, *args, **kwargs):
-        loadGames()
\ No newline at end of file
+        if kwargs["workers"] > 1 and (kwargs["record"] or kwargs["from_dump"] or kwargs["profile"]):
+            raise CommandError("--workers cannot be combined with --record, --from-dump or --profile")
+
+        result = loadGames(
+            concurrency=kwargs["concurrency"],
+            delta=kwargs["delta"],
+            method=kwargs["method"],
+            resume=kwargs["resume"],
+            record_to=kwargs["record"],
+            from_dump=kwargs["from_dump"],
+            pages_per_request=kwargs["multiquery"],
+            profile=kwargs["profile"],
+            workers=kwargs["workers"],
+        )
+        self.stdout.write(result)
+
+        # Leaderboards and genre counts are served from materialized views of the catalog
+        for view in (Leaderboard, GenreCount):
+            refresh_materialized_view(view._meta.db_table)
+        bump_catalog_version()
+        self.stdout.write("Leaderboards and genre counts refreshed")
+
+        # Typeahead reads titles from this file, not the database
+        games = build_suggestion_index()
+        self.stdout.write(f"Suggestion index rebuilt with {games} games")
+
+        # The refreshes moved the catalog version, so the per-genre counts
+        # of the unfiltered list are cached now rather than by a request
+        getGenreCounts("")
@@ -0,0 +1,126 @@
+import cProfile
+import pstats
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# Steps of an import, in the order a page goes through them
+INGESTION_STAGES = ["http", "decode", "transform", "insert", "m2m", "media", "analyze"]
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident memory of the process in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(metrics, stage):
+    """
+    Times a block under `stage` when metrics are being collected.
+
+    Example:
+        with timed(metrics, "insert"):
+            upsert_games(games)
+    """
+    return metrics.time(stage) if metrics else nullcontext()
+
+
+class IngestionMetrics:
+    """
+    Collects how long each ingestion step takes, per batch and for the whole run.
+
+    The steps run on different pipeline threads, so stage times are busy
+    time summed across threads and may add up to more than the wall time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(INGESTION_STAGES, 0.0)
+        self.batch = dict.fromkeys(INGESTION_STAGES, 0.0)
+        self.batches = 0
+        self.rows = 0
+        self.started = time.monotonic()
+
+    @contextmanager
+    def time(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - start)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.totals[stage] += seconds
+            self.batch[stage] += seconds
+
+    def end_batch(self, rows):
+        """
+        Closes the current batch and returns one line with its stage timings.
+
+        Fetch, decode and transform times are those accumulated since the
+        previous batch was written.
+
+        Parameters:
+            rows (int): The number of games the batch wrote.
+        """
+        with self.lock:
+            self.batches += 1
+            self.rows += rows
+            timings = " ".join(f"{stage}={seconds:.2f}s" for stage, seconds in self.batch.items())
+            self.batch = dict.fromkeys(INGESTION_STAGES, 0.0)
+
+        return f"batch={self.batches} games={rows} {timings} peak_rss={peak_memory_mb():.0f}MB"
+
+    def report(self):
+        """
+        Returns a summary table of the run: busy time per stage, rows/sec and peak memory.
+        """
+        elapsed = time.monotonic() - self.started
+        lines = [f"{'stage':<12}{'seconds':>10}{'% of wall':>11}{'per batch':>11}"]
+
+        for stage, seconds in self.totals.items():
+            share = seconds / elapsed * 100 if elapsed else 0
+            per_batch = seconds / self.batches if self.batches else 0
+            lines.append(f"{stage:<12}{seconds:>10.2f}{share:>10.0f}%{per_batch:>11.2f}")
+
+        rate = self.rows / elapsed if elapsed else 0
+        lines.append(
+            f"{self.rows} games in {elapsed:.1f}s ({rate:.0f} games/s), "
+            f"{self.batches} batches, peak memory {peak_memory_mb():.0f} MB"
+        )
+        return "\n".join(lines)
+
+
+def dump_profile(profilers, path, limit=20):
+    """
+    Merges the profilers of every ingestion thread into one cProfile dump.
+
+    Parameters:
+        profilers (list): The cProfile.Profile of each profiled thread.
+        path (str): Where the dump is written, readable with pstats or snakeviz.
+        limit (int): How many functions the printed summary lists.
+    """
+    stats = pstats.Stats(*profilers)
+    stats.dump_stats(path)
+
+    print(f"Profile written to {path}")
+    stats.sort_stats("cumulative").print_stats(limit)
+
+
+def profiled(target, profilers):
+    """
+    Wraps a thread target so it runs under its own profiler.
+
+    cProfile only sees the thread it was enabled on, so each pipeline
+    thread gets a profiler that is merged by `dump_profile` afterwards.
+    """
+    def run(*args):
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        return profiler.runcall(target, *args)
+
+    return run
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0036_remove_game_gamehub_gam_release_d0debc_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Full'), ('delta', 'Delta')], default='full', max_length=20)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('high_water_mark', models.BigIntegerField(blank=True, null=True)),
+                ('games_loaded', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='game_id',
+            field=models.IntegerField(unique=True),
+        ),
+    ]
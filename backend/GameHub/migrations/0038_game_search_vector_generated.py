@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0037_ingestionrun_alter_game_game_id'),
+    ]
+
+    # A regular column cannot be converted to a generated one in place, so the
+    # column and its index are re-created, which also fills every existing row
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_search_vector_idx',
+        ),
+        migrations.RemoveField(
+            model_name='game',
+            name='search_vector',
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('title', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='game_search_vector_idx'),
+        ),
+    ]
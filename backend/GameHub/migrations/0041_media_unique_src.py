@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+def delete_duplicate_media(apps, schema_editor):
+    """
+    Keeps the oldest row of every (game, src) pair so the unique constraints can be created.
+    """
+    for model_name in ("Video", "Screenshot"):
+        table = apps.get_model("GameHub", model_name)._meta.db_table
+        schema_editor.execute(f"""
+            DELETE FROM "{table}" a
+            USING "{table}" b
+            WHERE a.game_id = b.game_id AND a.src = b.src AND a.id > b.id
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0040_ingestionrun_parent'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_media, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='screenshot',
+            constraint=models.UniqueConstraint(fields=('game', 'src'), name='unique_screenshot_src'),
+        ),
+        migrations.AddConstraint(
+            model_name='video',
+            constraint=models.UniqueConstraint(fields=('game', 'src'), name='unique_video_src'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0041_media_unique_src'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='game',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['title'], name='title_trigram_gist_idx', opclasses=['gist_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0042_title_trigram_gist'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='GameHub_gam_title_46bb39_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='release_title_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='GameHub_gam_release_91391f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='rating_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['title', 'id'], name='title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['release', 'title', 'id'], name='release_asc_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(models.OrderBy(models.F('release'), descending=True, nulls_last=True), models.F('title'), models.F('id'), name='release_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(models.OrderBy(models.F('rating'), descending=True, nulls_last=True), models.F('title'), models.F('id'), name='rating_title_idx'),
+        ),
+    ]
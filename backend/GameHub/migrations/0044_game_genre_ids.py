@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def backfill_genre_ids(apps, schema_editor):
+    """
+    Copies every game's genre links into its genre_ids array with one UPDATE.
+    """
+    Game = apps.get_model("GameHub", "Game")
+    game = Game._meta.db_table
+    game_genre = Game.genres.through._meta.db_table
+    schema_editor.execute(f"""
+        UPDATE "{game}" g
+        SET genre_ids = ARRAY(SELECT t.genre_id FROM "{game_genre}" t WHERE t.game_id = g.id ORDER BY t.genre_id)
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0043_game_list_seek_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='genre_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.RunPython(backfill_genre_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='game',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genre_ids'], name='game_genre_ids_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+# Each board keeps its 20 best rated games (LEADERBOARD_SIZE), ranked by
+# rating, title then id. Genres come from the games' genre_ids and years
+# from the UTC release date.
+CREATE_LEADERBOARD = """
+    CREATE MATERIALIZED VIEW "GameHub_leaderboard" AS
+    WITH rated AS (
+        SELECT id, rating, title, genre_ids,
+               date_part('year', release AT TIME ZONE 'UTC')::integer AS release_year
+        FROM "GameHub_game"
+        WHERE rating IS NOT NULL
+    ),
+    ranked AS (
+        SELECT 'all' AS board, 0 AS board_key, id AS game_id,
+               row_number() OVER (ORDER BY rating DESC, title, id) AS position
+        FROM rated
+        UNION ALL
+        SELECT 'genre', g.genre_id, r.id,
+               row_number() OVER (PARTITION BY g.genre_id ORDER BY r.rating DESC, r.title, r.id)
+        FROM rated r CROSS JOIN LATERAL unnest(r.genre_ids) AS g(genre_id)
+        UNION ALL
+        SELECT 'year', release_year, id,
+               row_number() OVER (PARTITION BY release_year ORDER BY rating DESC, title, id)
+        FROM rated
+        WHERE release_year IS NOT NULL
+    )
+    SELECT board::varchar(10) AS board, board_key, position::integer AS position, game_id
+    FROM ranked
+    WHERE position <= 20;
+
+    CREATE UNIQUE INDEX leaderboard_position_idx ON "GameHub_leaderboard" (board, board_key, position);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0044_game_genre_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('pk', models.CompositePrimaryKey('board', 'board_key', 'position', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('board', models.CharField(choices=[('all', 'All'), ('genre', 'Genre'), ('year', 'Year')], max_length=10)),
+                ('board_key', models.IntegerField()),
+                ('position', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'GameHub_leaderboard',
+                'ordering': ['position'],
+                'managed': False,
+            },
+        ),
+        # The unique index lets the view be refreshed CONCURRENTLY
+        migrations.RunSQL(CREATE_LEADERBOARD, 'DROP MATERIALIZED VIEW "GameHub_leaderboard"'),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Aggregates only the narrow game/genre join table, one row per genre
+CREATE_GENRE_COUNT = """
+    CREATE MATERIALIZED VIEW "GameHub_genrecount" AS
+    SELECT genre_id, COUNT(*)::integer AS games
+    FROM "GameHub_game_genres"
+    GROUP BY genre_id;
+
+    CREATE UNIQUE INDEX genrecount_genre_idx ON "GameHub_genrecount" (genre_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('GameHub', '0045_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenreCount',
+            fields=[
+                ('genre', models.OneToOneField(on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='GameHub.genre')),
+                ('games', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'GameHub_genrecount',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_GENRE_COUNT, 'DROP MATERIALIZED VIEW "GameHub_genrecount"'),
+    ]
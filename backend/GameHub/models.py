@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.text import slugify
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.contrib.postgres.search import SearchVectorField
 from django.contrib.postgres.search import SearchVector
 from django.contrib.auth.models import User
@@ -20,6 +21,9 @@ PROFILE_VISIBILITY_OPTIONS = [
     ('hidden', 'Hidden'),
 ]
 
+# Text search configuration used by the Game search vector and its queries
+SEARCH_CONFIG = "english"
+
 # -------------------- Profile & Authentication --------------------
 
 class Profile(models.Model):
@@ -57,6 +61,35 @@ class Token(models.Model):
     token_type = models.CharField(max_length=50)
 
 
+class IngestionRun(models.Model):
+    """
+    Records a run of the IGDB game import.
+
+    The high water mark is the IGDB `updated_at` timestamp a later delta
+    sync asks for changes after. Every committed batch checkpoints the
+    highest IGDB id it wrote in the same transaction, so an unfinished run
+    can be resumed right after its last committed batch.
+
+    A sharded import is a parent run whose shards are child runs, each
+    fetching one IGDB id range and checkpointing on its own. The parent
+    finishes once every shard has.
+    """
+    MODE_CHOICES = [('full', 'Full'), ('delta', 'Delta')]
+
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default='full')
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    high_water_mark = models.BigIntegerField(null=True, blank=True)
+    games_loaded = models.PositiveIntegerField(default=0)
+    query_filter = models.TextField(blank=True, default="")
+    last_game_id = models.IntegerField(null=True, blank=True)
+    batches_committed = models.PositiveIntegerField(default=0)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='shards')
+
+    def __str__(self):
+        return f"{self.mode} run {self.started_at:%Y-%m-%d %H:%M}"
+
+
 
 # -------------------- Game & Media Models --------------------
 
@@ -74,20 +107,30 @@ class Game(models.Model):
     """
     Stores information about a game, including metadata, genre, and search indexing.
     """
-    game_id = models.CharField(max_length=100)
+    game_id = models.IntegerField(unique=True)
     title = models.CharField(max_length=255)
     cover_image =  models.URLField(null=True, blank=True)
     summary = models.TextField(max_length=10000, blank=True, null=True)
     storyline = models.TextField(max_length=10000, null=True, blank=True)
     genres = models.ManyToManyField(Genre, related_name='games')
+    # Sorted ids of `genres`, kept in sync by ingestion and the m2m_changed
+    # signal, so genre filters are a predicate on the game row (`@>` / `&&`)
+    # instead of a join through the M2M table
+    genre_ids = ArrayField(models.IntegerField(), default=list, blank=True, editable=False)
     rating = models.FloatField(null=True, blank=True)
     release = models.DateTimeField( null=True, blank=True)
     slug = models.SlugField(unique=True, blank=True, max_length=120)
-    search_vector = SearchVectorField(null=True)
+    # Maintained by Postgres from the title, so inserts and saves never
+    # need a second UPDATE to keep it current
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     def save(self, *args, **kwargs):
         """
-        Auto-generates a unique slug and updates the search vector for the title field.
+        Auto-generates a unique slug for the title field.
         """
         should_update_slug = False
 
@@ -109,20 +152,21 @@ class Game(models.Model):
 
         super().save(*args, **kwargs)
 
-        # Update search_vector after saving (needs a DB hit)
-        Game.objects.filter(pk=self.pk).update(search_vector=SearchVector(F('title')))
-
     def __str__(self):
         return self.title
 
     class Meta:
         indexes = [
-             models.Index(fields=["title"]),
-            models.Index(fields=["release", "title"]),
-            models.Index(fields=["-release", "title"], name="release_title_idx"),
-            models.Index(fields=["-rating", "title"], name="rating_title_idx"),
+            # Match the game list sorts, NULLs last and id as the final
+            # tiebreaker, so keyset pages are a single index range scan
+            models.Index(fields=["title", "id"], name="title_id_idx"),
+            models.Index(fields=["release", "title", "id"], name="release_asc_title_idx"),
+            models.Index(F("release").desc(nulls_last=True), F("title"), F("id"), name="release_title_idx"),
+            models.Index(F("rating").desc(nulls_last=True), F("title"), F("id"), name="rating_title_idx"),
             GinIndex(fields=['title'], name='title_trigram_idx', opclasses=['gin_trgm_ops']),
+            GistIndex(fields=['title'], name='title_trigram_gist_idx', opclasses=['gist_trgm_ops']),
             GinIndex(fields=['search_vector'], name='game_search_vector_idx'),
+            GinIndex(fields=['genre_ids'], name='game_genre_ids_idx'),
         ]
 
 
@@ -133,6 +177,11 @@ class Video(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     src = models.URLField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "src"], name="unique_video_src"),
+        ]
+
     def __str__(self):
         return f"{self.game.title}-{self.id}"
 
@@ -144,9 +193,63 @@ class Screenshot(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     src = models.URLField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "src"], name="unique_screenshot_src"),
+        ]
+
     def __str__(self):
         return f"{self.game.title}-{self.id}"
 
+# -------------------- Catalog Summaries --------------------
+
+# Games kept per leaderboard
+LEADERBOARD_SIZE = 20
+
+
+class Leaderboard(models.Model):
+    """
+    Read-only rows of the leaderboard materialized view.
+
+    Holds the LEADERBOARD_SIZE best rated games overall (board "all"), of
+    every genre (board "genre", keyed by genre id) and of every release year
+    (board "year", keyed by year). The view is created by a migration and
+    refreshed after each import, so a leaderboard is an index lookup on
+    (board, board_key, position) instead of a sort of the catalog.
+    """
+    BOARD_CHOICES = [('all', 'All'), ('genre', 'Genre'), ('year', 'Year')]
+
+    pk = models.CompositePrimaryKey("board", "board_key", "position")
+    board = models.CharField(max_length=10, choices=BOARD_CHOICES)
+    board_key = models.IntegerField()
+    position = models.IntegerField()
+    game = models.ForeignKey(Game, on_delete=models.DO_NOTHING, related_name='+')
+
+    class Meta:
+        managed = False
+        db_table = 'GameHub_leaderboard'
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.board} {self.board_key} #{self.position}"
+
+
+class GenreCount(models.Model):
+    """
+    Read-only rows of the genre count materialized view: the number of
+    games of every genre, refreshed after each import like the leaderboards.
+    """
+    genre = models.OneToOneField(Genre, on_delete=models.DO_NOTHING, primary_key=True, related_name='+')
+    games = models.IntegerField()
+
+    class Meta:
+        managed = False
+        db_table = 'GameHub_genrecount'
+
+    def __str__(self):
+        return f"{self.genre_id}: {self.games}"
+
+
 # -------------------- Password Recovery --------------------
 
 def generate_unique_code(length=50):
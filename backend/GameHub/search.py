@@ -0,0 +1,408 @@
+import base64
+import datetime
+import json
+
+from django.contrib.postgres.search import SearchQuery, TrigramDistance
+from django.db import connection
+from django.db.models import F, Q
+
+from .cache import catalog_key, get_or_compute
+from .counts import estimate_game_count, get_genre_count, get_genre_counts
+from .models import Game, Genre, SEARCH_CONFIG
+
+
+def fuzzy_search(queryset, search_word, field="title"):
+    """
+    Filters a queryset to the rows whose `field` is similar to the search word.
+
+    The filter is `field % search_word`, with the threshold every session
+    gets from settings.TRIGRAM_SIMILARITY_THRESHOLD. It is answered from
+    the trigram GIN/GiST index rather than by computing similarity() for
+    every row, and each row is annotated with its trigram `distance`
+    (`<->`). Ordering by distance lets a GiST index return the nearest
+    titles first, so a top-K lookup only reads a few index pages.
+
+    Parameters:
+        queryset (QuerySet): The rows to search.
+        search_word (str): The user's search input.
+        field (str): The text field compared against the search word.
+
+    Returns:
+        QuerySet: The matching rows annotated with `distance`, closest first.
+
+    Example:
+        fuzzy_search(Game.objects.all(), "zelda brth")[:5]
+    """
+    return queryset.filter(
+        **{f"{field}__trigram_similar": search_word}
+    ).annotate(
+        distance=TrigramDistance(field, search_word)
+    ).order_by("distance")
+
+
+# The game list never shows more than this many pages of results
+MAX_PAGES = 500
+
+GAME_LIST_ORDERS = {
+    "relevance": "m.rank DESC, g.title ASC, g.id ASC",
+    "name": "g.title ASC, g.id ASC",
+    "release(asc)": "g.release ASC NULLS LAST, g.title ASC, g.id ASC",
+    "release(desc)": "g.release DESC NULLS LAST, g.title ASC, g.id ASC",
+    "rating": "g.rating DESC NULLS LAST, g.title ASC, g.id ASC",
+}
+
+
+GENRE_MATCHES = ("any", "all")
+
+
+def genre_filter_ids(genre):
+    """
+    Returns the ids of the genres a genre filter names, None when it doesn't filter.
+
+    Parameters:
+        genre (str): "All", a genre name or several names separated by commas.
+            Unknown names are ignored rather than matching nothing.
+
+    Returns:
+        list | None: The sorted genre ids, or None for no filter.
+    """
+    if genre == "All":
+        return None
+
+    # The name -> id map is cached with the catalog, so the list query
+    # stays the only statement of an uncached page
+    ids_by_name = get_or_compute(catalog_key("genre_ids_by_name"), load_genre_ids)
+
+    names = {name.strip() for name in genre.split(",") if name.strip()}
+    genre_ids = sorted({ids_by_name[name] for name in names if name in ids_by_name})
+    return genre_ids or None
+
+
+def load_genre_ids():
+    """
+    Returns the id of every genre by name, the lowest id when a name is stored twice.
+    """
+    return dict(Genre.objects.order_by("-id").values_list("name", "id"))
+
+
+# The games matching a search word, as `matched (id, rank)`: full-text
+# matches when there are any, trigram matches (`%`) otherwise. The fuzzy
+# branch only runs when the full-text CTE is empty, so the choice is made
+# inside the statement. Takes the `config` and `search_word` parameters.
+MATCHED_CTES = """
+    WITH fulltext AS MATERIALIZED (
+        SELECT id, ts_rank(search_vector, plainto_tsquery(%(config)s, %(search_word)s)) AS rank
+        FROM "{game}"
+        WHERE search_vector @@ plainto_tsquery(%(config)s, %(search_word)s)
+    ),
+    matched AS (
+        SELECT id, rank FROM fulltext
+        UNION ALL
+        SELECT id, 1 - (title <-> %(search_word)s) AS rank
+        FROM "{game}"
+        WHERE title %% %(search_word)s AND NOT EXISTS (SELECT 1 FROM fulltext)
+    )
+"""
+
+
+def game_list_query(search_word, genre_ids, genre_match):
+    """
+    Builds the CTEs, FROM and WHERE clauses selecting the games `g` of the game list.
+
+    With a search word, the games of MATCHED_CTES are used, joined as `m`.
+    The genre filter is a predicate on the game's own genre_ids (`@>` for
+    all, `&&` for any), so no join is needed and the sort indexes stay usable.
+
+    Returns:
+        tuple: The ctes, source and where SQL, and their parameters.
+    """
+    game = Game._meta.db_table
+    params = {"search_word": search_word, "config": SEARCH_CONFIG, "genre_ids": genre_ids}
+
+    if search_word:
+        ctes = MATCHED_CTES.format(game=game)
+        source = f'matched m JOIN "{game}" g ON g.id = m.id'
+    else:
+        ctes = ""
+        source = f'"{game}" g'
+
+    where = "TRUE"
+    if genre_ids:
+        operator = "@>" if genre_match == "all" else "&&"
+        where = f"g.genre_ids {operator} %(genre_ids)s::integer[]"
+
+    return ctes, source, where, params
+
+
+def search_game_ids(search_word, genre, sort_option, limit, genre_match="any"):
+    """
+    Returns the ids of the games of the game list, in list order, with a single query.
+
+    The games of game_list_query are sorted and cut at `limit`.
+
+    Parameters:
+        search_word (str): The keyword to search games by title, may be empty.
+        genre (str): Genre names to filter by, see genre_filter_ids.
+        sort_option (str): A key of GAME_LIST_ORDERS, anything else sorts by release(desc).
+        limit (int): The maximum number of ids returned, e.g. MAX_PAGES pages.
+        genre_match (str): "any" to match games with at least one of the
+            genres, "all" for games with every one of them.
+
+    Returns:
+        list: Game primary keys.
+    """
+    ctes, source, where, params = game_list_query(search_word, genre_filter_ids(genre), genre_match)
+
+    if not search_word and sort_option == "relevance":
+        sort_option = "release(desc)"
+    order = GAME_LIST_ORDERS.get(sort_option, GAME_LIST_ORDERS["release(desc)"])
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            {ctes}
+            SELECT g.id
+            FROM {source}
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT %(limit)s
+        """, {**params, "limit": limit})
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_game_list(search_word, genre, limit, genre_match="any"):
+    """
+    Counts the games of the game list, up to `limit`, without reading more rows than that.
+
+    The list never shows more than MAX_PAGES pages, so counting past
+    `limit` is pointless. Depending on the list, the count is:
+
+    - unfiltered: the planner's row estimate of the game table (reltuples),
+      when it's above `limit` the true count certainly doesn't matter
+    - one genre without a search word: the precomputed GenreCount
+    - anything else, or when neither is available: an exact count over a
+      `LIMIT limit` subquery, so at most `limit` rows are read
+
+    None of them grows with the size of the catalog.
+
+    Parameters:
+        search_word (str): The keyword to search games by title, may be empty.
+        genre (str): Genre names to filter by, see genre_filter_ids.
+        limit (int): The highest count that matters, e.g. MAX_PAGES pages.
+        genre_match (str): "any" or "all" of the genres, as in search_game_ids.
+
+    Returns:
+        int: The number of games, at most `limit`.
+    """
+    genre_ids = genre_filter_ids(genre)
+
+    if not search_word:
+        if genre_ids is None:
+            estimate = estimate_game_count()
+        elif len(genre_ids) == 1:
+            estimate = get_genre_count(genre_ids[0])
+        else:
+            estimate = None
+
+        # A single genre is counted exactly, the unfiltered estimate is
+        # only trusted when it's well clear of the cap
+        if estimate is not None and (genre_ids or estimate >= 2 * limit):
+            return min(estimate, limit)
+
+    ctes, source, where, params = game_list_query(search_word, genre_ids, genre_match)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            {ctes}
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM {source} WHERE {where} LIMIT %(limit)s
+            ) capped
+        """, {**params, "limit": limit})
+        return cursor.fetchone()[0]
+
+
+def count_genres(search_word):
+    """
+    Counts the games matching a search word per genre, with one grouped query.
+
+    The counts are taken over the whole matched set (MATCHED_CTES), ignoring
+    the selected genre, so every genre of the filter can show how many
+    results choosing it would give. Without a search word they are the
+    precomputed GenreCount rows.
+
+    Parameters:
+        search_word (str): The keyword to search games by title, may be empty.
+
+    Returns:
+        dict: The number of matching games of each genre name, genres
+            without a match are left out.
+
+    Example:
+        count_genres("zelda")  # {"Adventure": 31, "Puzzle": 4, ...}
+    """
+    if not search_word:
+        return get_genre_counts()
+
+    game = Game._meta.db_table
+    genre_table = Genre._meta.db_table
+    game_genre = Game.genres.through._meta.db_table
+    ctes = MATCHED_CTES.format(game=game)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            {ctes}
+            SELECT ge.name, c.games
+            FROM (
+                SELECT gg.genre_id, COUNT(*) AS games
+                FROM matched m JOIN "{game_genre}" gg ON gg.game_id = m.id
+                GROUP BY gg.genre_id
+            ) c
+            JOIN "{genre_table}" ge ON ge.id = c.genre_id
+            ORDER BY ge.name
+        """, {"search_word": search_word, "config": SEARCH_CONFIG})
+        return dict(cursor.fetchall())
+
+
+# Sort options the game list can seek on: the column sorted on before title
+# and id, and whether it is descending. Each matches a Game index on
+# (column, title, id) with NULLs last.
+SEEK_ORDERS = {
+    "name": (None, False),
+    "release(asc)": ("release", False),
+    "release(desc)": ("release", True),
+    "rating": ("rating", True),
+}
+
+GAME_LIST_FIELDS = ["game_id", "slug", "title", "cover_image", "release", "rating"]
+
+
+def encode_cursor(sort_option, game):
+    """
+    Returns the opaque cursor of the page starting right after `game`.
+    """
+    column, _ = SEEK_ORDERS[sort_option]
+    value = getattr(game, column) if column else None
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+
+    payload = json.dumps([sort_option, value, game.title, game.pk])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, sort_option):
+    """
+    Returns the (value, title, id) sort key a cursor points after.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another sort.
+    """
+    try:
+        cursor_sort, value, title, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if cursor_sort != sort_option:
+        raise ValueError("Cursor was issued for another sort")
+
+    column, _ = SEEK_ORDERS[sort_option]
+    value_types = {None: (type(None),), "release": (str, type(None)), "rating": (int, float, type(None))}[column]
+
+    # bool is an int, but never a valid id or rating
+    if (
+        not isinstance(value, value_types) or isinstance(value, bool)
+        or not isinstance(title, str)
+        or not isinstance(pk, int) or isinstance(pk, bool)
+    ):
+        raise ValueError("Invalid cursor")
+
+    if column == "release" and value is not None:
+        try:
+            value = datetime.datetime.fromisoformat(value)
+        except ValueError as e:
+            raise ValueError("Invalid cursor") from e
+    return value, title, pk
+
+
+def search_games(search_word):
+    """
+    Returns the games matching a search word: full-text matches when there
+    are any, trigram matches otherwise.
+    """
+    search_query = SearchQuery(search_word, config=SEARCH_CONFIG)
+    fulltext_results = Game.objects.filter(search_vector=search_query)
+
+    if fulltext_results.exists():
+        return fulltext_results
+    return fuzzy_search(Game.objects.all(), search_word)
+
+
+def seek_game_page(search_word, genre, sort_option, cursor, per_page, genre_match="any"):
+    """
+    Fetches the page of the game list following a cursor, using keyset pagination.
+
+    Instead of an OFFSET, the page starts with a seek on its sort key, e.g.
+    `release <= r AND (release < r OR (title, id) > (t, i))`, which an index
+    on (release, title, id) answers by jumping straight to the cursor. A deep
+    page therefore costs the same as the first one.
+
+    NULLs sort last, so a NULL can't be compared against: games with a value
+    and games without one are read as two index ranges, the second only
+    queried once the first runs out.
+
+    Parameters:
+        search_word (str): The keyword to search games by title, may be empty.
+        genre (str): Genre names to filter by, see genre_filter_ids.
+        sort_option (str): A key of SEEK_ORDERS.
+        cursor (str): The cursor returned with the previous page, empty for the first page.
+        per_page (int): Number of games per page.
+        genre_match (str): "any" or "all" of the genres, as in search_game_ids.
+
+    Returns:
+        tuple: The Game instances of the page and the cursor of the next page,
+            None on the last page.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    column, descending = SEEK_ORDERS[sort_option]
+    games = search_games(search_word) if search_word else Game.objects.all()
+    games = games.only(*GAME_LIST_FIELDS)
+
+    genre_ids = genre_filter_ids(genre)
+    if genre_ids:
+        lookup = "genre_ids__contains" if genre_match == "all" else "genre_ids__overlap"
+        games = games.filter(**{lookup: genre_ids})
+
+    # One extra row tells whether there is a next page
+    limit = per_page + 1
+    after = None
+    if cursor:
+        value, title, pk = decode_cursor(cursor, sort_option)
+        # title >= t is redundant but gives the index a range to scan
+        after = Q(title__gte=title) & (Q(title__gt=title) | Q(id__gt=pk))
+
+    if column is None:
+        games = games.filter(after) if after else games
+        page = list(games.order_by("title", "id")[:limit])
+    else:
+        page = []
+
+        if after is None or value is not None:
+            with_value = games.filter(**{f"{column}__isnull": False})
+            if after:
+                bound, beyond = ("lte", "lt") if descending else ("gte", "gt")
+                with_value = with_value.filter(
+                    Q(**{f"{column}__{bound}": value})
+                    & (Q(**{f"{column}__{beyond}": value}) | Q(title__gt=title) | Q(title=title, id__gt=pk))
+                )
+
+            order = F(column).desc(nulls_last=True) if descending else F(column).asc(nulls_last=True)
+            page = list(with_value.order_by(order, "title", "id")[:limit])
+
+        if len(page) < limit:
+            without_value = games.filter(**{f"{column}__isnull": True})
+            if after and value is None:
+                without_value = without_value.filter(after)
+            page += list(without_value.order_by("title", "id")[:limit - len(page)])
+
+    next_cursor = encode_cursor(sort_option, page[per_page - 1]) if len(page) > per_page else None
+    return page[:per_page], next_cursor
@@ -36,7 +36,8 @@ class GetGameSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Game
-        fields = '__all__'
+        # genre_ids only backs the genre filters, `genres` already lists them
+        exclude = ["genre_ids"]
 
 class GetGameSuggetionsSerializer(serializers.ModelSerializer):
     """
@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import Profile, Game
+from .cache import bump_catalog_version, forget_game_cards
+from .ingestion import sync_genre_ids
 
 
 @receiver(post_save, sender=User)
@@ -19,4 +21,37 @@ def save_user_profile(sender, instance, **kwargs):
     Signal receiver that saves the Profile instance
     whenever the User is saved.
     """
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+def invalidate_catalog_caches(sender, instance, **kwargs):
+    """
+    Signal receiver that drops the game's cached card and bumps the catalog
+    version when a game is saved or deleted outside of ingestion, e.g. from the admin.
+    """
+    forget_game_cards([instance.pk])
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Game.genres.through)
+def sync_game_genre_ids(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver that keeps Game.genre_ids in step with genre links
+    changed outside of ingestion, from either side of the relation.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        game_pks = [instance.pk]
+    elif action == "post_clear":
+        # The cleared links are gone, so match the games still listing the genre
+        game_pks = list(Game.objects.filter(genre_ids__contains=[instance.pk]).values_list("pk", flat=True))
+    else:
+        game_pks = pk_set
+
+    # Cards don't show genres, only the filtered lists change
+    sync_genre_ids(game_pks)
+    bump_catalog_version()
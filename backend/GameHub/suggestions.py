@@ -0,0 +1,300 @@
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Game
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"GHSUGG01"
+HEADER = struct.Struct("<III")
+
+# Keys are stored as fixed-width, NUL padded utf-8 so the sorted array can
+# be binary searched in place inside the memory-mapped file
+KEY_WIDTH = 24
+RECORD = struct.Struct(f"<{KEY_WIDTH}sI")
+OFFSET = struct.Struct("<I")
+
+# Prefixes matching more than SCAN_LIMIT keys have their best games
+# precomputed. Any other prefix scans at most SCAN_LIMIT keys, so every
+# lookup stays in microseconds.
+SCAN_LIMIT = 256
+MAX_SUGGESTIONS = 5
+
+# How often a worker checks whether the index file was rebuilt
+RELOAD_INTERVAL = 30
+
+SUGGESTION_FIELDS = ["id", "cover_image", "slug", "title"]
+
+
+def normalize(text):
+    """
+    Lowercases a title or query, strips accents and collapses everything but
+    letters and digits into single spaces, so "Pokémon: Red" and "pokemon red" match.
+    """
+    text = "".join(c for c in unicodedata.normalize("NFKD", text.casefold()) if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+def encode_key(text):
+    """
+    Truncates a normalized string to KEY_WIDTH bytes of utf-8 without splitting a character.
+    """
+    return text.encode()[:KEY_WIDTH].decode("utf-8", "ignore").encode()
+
+
+def index_path():
+    return settings.SUGGESTION_INDEX_PATH
+
+
+def build_suggestion_index(path=None):
+    """
+    Builds the title suggestion index file from the Game table.
+
+    Games are numbered by rating, best first, and every word of a title
+    starts one key, so "zel" finds "The Legend of Zelda". Keys are sorted
+    by (key, game number), so within a prefix range the best rated games
+    come first among equal keys. The file is written next to the old one
+    and swapped in atomically, workers pick it up on their next reload check.
+
+    File layout:
+        magic, key count, game count, length of the top prefix table
+        top prefix table: JSON {prefix: [game numbers]} for prefixes matching many keys
+        keys: key count fixed-width (key, game number) records, sorted
+        offsets: game count + 1 positions of each game in the games blob
+        games: the suggestion fields of every game as JSON, in game number order
+
+    Parameters:
+        path (str): Where the index is written, defaults to settings.SUGGESTION_INDEX_PATH.
+
+    Returns:
+        int: The number of games indexed.
+    """
+    path = path or index_path()
+    games = Game.objects.order_by(F("rating").desc(nulls_last=True), "title").values_list(*SUGGESTION_FIELDS)
+
+    records = []
+    blobs = []
+    for number, (pk, cover_image, slug, title) in enumerate(games.iterator(chunk_size=5000)):
+        blobs.append(json.dumps({"id": pk, "cover_image": cover_image, "slug": slug, "title": title}).encode())
+
+        words = normalize(title).split(" ")
+        for i in range(len(words)):
+            key = " ".join(words[i:])
+            if key:
+                records.append((key, number))
+
+    records = sorted((encode_key(key), number) for key, number in records)
+    top = top_prefixes([key.decode() for key, _ in records], [number for _, number in records])
+    top_json = json.dumps(top).encode()
+
+    # A uniquely named file, so concurrent builds never write into each other's
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(os.path.abspath(path)), delete=False) as f:
+        try:
+            write_index(f, records, blobs, top_json)
+            # Temporary files are private, the index is read by every worker
+            os.chmod(f.name, 0o644)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+    os.replace(f.name, path)
+    return len(blobs)
+
+
+def top_prefixes(keys, numbers):
+    """
+    Returns the best games of every prefix matching more than SCAN_LIMIT keys.
+
+    Keys are sorted, so the keys starting with a prefix are a contiguous
+    range. A prefix can only match that many keys if the prefix one
+    character shorter does, so only the ranges of such prefixes are split
+    by their next character, whatever their length.
+
+    Parameters:
+        keys (list): The sorted keys.
+        numbers (list): The game number of each key, lower is better rated.
+
+    Returns:
+        dict: {prefix: [game numbers]}, at most MAX_SUGGESTIONS best first.
+    """
+    top = {}
+    ranges = [("", 0, len(keys))]
+
+    while ranges:
+        prefix, lo, hi = ranges.pop()
+        length = len(prefix) + 1
+
+        i = lo
+        while i < hi:
+            # The key equal to the prefix itself sorts first and has no next character
+            if len(keys[i]) < length:
+                i += 1
+                continue
+
+            child = keys[i][:length]
+            j = i + 1
+            while j < hi and keys[j].startswith(child):
+                j += 1
+
+            if j - i > SCAN_LIMIT:
+                top[child] = heapq.nsmallest(MAX_SUGGESTIONS, set(numbers[i:j]))
+                ranges.append((child, i, j))
+            i = j
+
+    return top
+
+
+def write_index(f, records, blobs, top_json):
+    """
+    Writes the index file layout described in build_suggestion_index.
+    """
+    f.write(MAGIC)
+    f.write(HEADER.pack(len(records), len(blobs), len(top_json)))
+    f.write(top_json)
+    for key, number in records:
+        f.write(RECORD.pack(key, number))
+
+    offset = 0
+    for blob in blobs:
+        f.write(OFFSET.pack(offset))
+        offset += len(blob)
+    f.write(OFFSET.pack(offset))
+
+    for blob in blobs:
+        f.write(blob)
+
+
+class SuggestionIndex:
+    """
+    Read-only view of a suggestion index file, memory-mapped so every worker
+    process on the host shares the same pages.
+
+    A lookup is either a precomputed top list or a binary search of the
+    sorted keys in place followed by a scan of at most SCAN_LIMIT records,
+    so it costs microseconds and never touches Postgres.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.path.getmtime(path)
+
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a suggestion index")
+
+        position = len(MAGIC)
+        self.key_count, self.game_count, top_length = HEADER.unpack_from(self.data, position)
+        position += HEADER.size
+
+        self.top = json.loads(self.data[position:position + top_length])
+        position += top_length
+
+        self.keys_start = position
+        self.offsets_start = self.keys_start + self.key_count * RECORD.size
+        self.games_start = self.offsets_start + (self.game_count + 1) * OFFSET.size
+
+    def record(self, i):
+        return RECORD.unpack_from(self.data, self.keys_start + i * RECORD.size)
+
+    def game(self, number):
+        start, end = struct.unpack_from("<II", self.data, self.offsets_start + number * OFFSET.size)
+        return json.loads(self.data[self.games_start + start:self.games_start + end])
+
+    def search(self, query, limit=MAX_SUGGESTIONS):
+        """
+        Returns up to `limit` games with a title word starting with `query`, best rated first.
+
+        Parameters:
+            query (str): What the user has typed so far.
+            limit (int): The maximum number of games returned.
+
+        Returns:
+            list: Dicts of the suggestion fields (id, cover_image, slug, title).
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        if query in self.top:
+            return [self.game(number) for number in self.top[query][:limit]]
+
+        prefix = encode_key(query)
+        start = bisect.bisect_left(KeyView(self), prefix)
+
+        numbers = set()
+        for i in range(start, min(start + SCAN_LIMIT, self.key_count)):
+            key, number = self.record(i)
+            if not key.startswith(prefix):
+                break
+            numbers.add(number)
+
+        # Queries longer than a key are checked against the whole title
+        if len(query.encode()) > KEY_WIDTH:
+            games = (self.game(number) for number in sorted(numbers))
+            return [game for game in games if f" {query}" in f" {normalize(game['title'])}"][:limit]
+
+        return [self.game(number) for number in heapq.nsmallest(limit, numbers)]
+
+
+class KeyView:
+    """
+    Sequence of the index's keys, without their NUL padding, for bisect.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __len__(self):
+        return self.index.key_count
+
+    def __getitem__(self, i):
+        return self.index.record(i)[0].rstrip(b"\0")
+
+
+_index = None
+_checked_at = 0
+_lock = threading.Lock()
+
+
+def get_suggestion_index():
+    """
+    Returns this process's suggestion index, or None if it hasn't been built.
+
+    The file is mapped on first use and remapped when a rebuild replaced it.
+    """
+    global _index, _checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < RELOAD_INTERVAL:
+        return _index
+
+    with _lock:
+        _checked_at = now
+        path = index_path()
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            _index = None
+            return None
+
+        if _index is None or _index.mtime != mtime:
+            try:
+                _index = SuggestionIndex(path)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not load suggestion index %s: %s", path, e)
+                _index = None
+        return _index
@@ -1,3 +1,510 @@
-from django.test import TestCase
+import base64
+import datetime
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from . import cache as catalog_cache
+from . import igdb
+from .cache import SingleFlight, get_or_compute
+from .igdb import IGDBClient, IGDBError, read_dump_pages, record_pages, unpack_multiquery
+from .ingestion import CopyStream, Pipeline, copy_value
+from .models import Game
+from .search import decode_cursor, encode_cursor
+from .suggestions import SCAN_LIMIT, SuggestionIndex, build_suggestion_index, normalize
+
+
+def raw_cursor(payload):
+    """
+    Encodes a cursor payload the way encode_cursor does, without validating it.
+    """
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class CursorTests(SimpleTestCase):
+    """
+    Tests the keyset pagination cursors of the game list.
+    """
+
+    def test_round_trip(self):
+        release = datetime.datetime(2017, 3, 3, tzinfo=datetime.timezone.utc)
+        game = Game(pk=7, title="Zelda", release=release, rating=97.5)
+
+        self.assertEqual(decode_cursor(encode_cursor("name", game), "name"), (None, "Zelda", 7))
+        self.assertEqual(decode_cursor(encode_cursor("release(desc)", game), "release(desc)"), (release, "Zelda", 7))
+        self.assertEqual(decode_cursor(encode_cursor("rating", game), "rating"), (97.5, "Zelda", 7))
+
+    def test_round_trip_without_value(self):
+        game = Game(pk=3, title="Unreleased", release=None, rating=None)
+
+        self.assertEqual(decode_cursor(encode_cursor("release(asc)", game), "release(asc)"), (None, "Unreleased", 3))
+        self.assertEqual(decode_cursor(encode_cursor("rating", game), "rating"), (None, "Unreleased", 3))
+
+    def test_other_sort(self):
+        cursor = encode_cursor("rating", Game(pk=1, title="A", rating=50))
+
+        with self.assertRaisesMessage(ValueError, "another sort"):
+            decode_cursor(cursor, "name")
+
+    def test_malformed(self):
+        for cursor in ["", "!!!", raw_cursor(5), raw_cursor(["name", None, "a"])]:
+            with self.subTest(cursor=cursor), self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                decode_cursor(cursor, "name")
+
+    def test_wrong_types(self):
+        cursors = [
+            ("release(desc)", ["release(desc)", 5, "a", 1]),
+            ("release(desc)", ["release(desc)", "yesterday", "a", 1]),
+            ("rating", ["rating", "97", "a", 1]),
+            ("rating", ["rating", True, "a", 1]),
+            ("rating", ["rating", 97, None, 1]),
+            ("rating", ["rating", 97, "a", "1"]),
+            ("name", ["name", 5, "a", 1]),
+        ]
+        for sort_option, payload in cursors:
+            with self.subTest(payload=payload), self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                decode_cursor(raw_cursor(payload), sort_option)
+
+
+class SuggestionIndexTests(SimpleTestCase):
+    """
+    Tests building and searching the memory-mapped title suggestion index.
+    """
+
+    def build(self, titles):
+        """
+        Builds an index of `titles`, given best rated first, and returns it opened.
+        """
+        rows = [(pk, None, f"game-{pk}", title) for pk, title in enumerate(titles)]
+        games = mock.Mock()
+        games.values_list.return_value.iterator.return_value = iter(rows)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "suggestions.idx")
+
+        with mock.patch.object(Game.objects, "order_by", return_value=games):
+            self.assertEqual(build_suggestion_index(path), len(titles))
+
+        index = SuggestionIndex(path)
+        self.addCleanup(index.data.close)
+        return index
+
+    def titles(self, index, query):
+        return [game["title"] for game in index.search(query)]
+
+    def test_normalize(self):
+        self.assertEqual(normalize("Pokémon: Red & Blue!"), "pokemon red blue")
+
+    def test_matches_any_word_best_rated_first(self):
+        index = self.build(["Breath of the Wild", "The Legend of Zelda", "Zelda II", "Pong"])
+
+        self.assertEqual(self.titles(index, "zel"), ["The Legend of Zelda", "Zelda II"])
+        self.assertEqual(self.titles(index, "the"), ["Breath of the Wild", "The Legend of Zelda"])
+        self.assertEqual(self.titles(index, "legend of z"), ["The Legend of Zelda"])
+        self.assertEqual(self.titles(index, "POKE"), [])
+        self.assertEqual(self.titles(index, ""), [])
+
+    def test_accents(self):
+        index = self.build(["Pokémon Red", "Okami"])
+
+        self.assertEqual(self.titles(index, "pokemon"), ["Pokémon Red"])
+        self.assertEqual(self.titles(index, "Pokém"), ["Pokémon Red"])
+
+    def test_broad_prefix_returns_best_rated(self):
+        # The best rated games sort last alphabetically, so a scan of the
+        # first keys of the range would miss them
+        best = [f"Star Wars zzz {i}" for i in range(5)]
+        rest = [f"Star Wars aaa {i}" for i in range(SCAN_LIMIT + 100)]
+        index = self.build(best + rest)
+
+        for query in ["s", "star wa", "star wars", "star wars ", "wars"]:
+            with self.subTest(query=query):
+                self.assertEqual(self.titles(index, query), best)
+
+        self.assertEqual(self.titles(index, "star wars a"), rest[:5])
+
+    def test_query_longer_than_keys(self):
+        index = self.build(["A Very Long Title That Goes Past The Key Width", "A Very Long Title That Goes Elsewhere"])
+
+        self.assertEqual(
+            self.titles(index, "a very long title that goes past"),
+            ["A Very Long Title That Goes Past The Key Width"],
+        )
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CatalogCacheTests(SimpleTestCase):
+    """
+    Tests the stale-while-revalidate catalog cache and its request coalescing.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value="new"):
+        def compute():
+            self.calls += 1
+            return value
+        return compute
+
+    def test_miss_is_computed_once(self):
+        self.assertEqual(get_or_compute("key", self.compute()), "new")
+        self.assertEqual(get_or_compute("key", self.compute()), "new")
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get("key:lock"))
+
+    def test_rejected_value_is_not_cached(self):
+        for _ in range(2):
+            self.assertEqual(get_or_compute("key", self.compute([]), cache_if=bool), [])
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_value_is_refreshed(self):
+        cache.set("key", {"value": "old", "fresh_until": 0})
+
+        self.assertEqual(get_or_compute("key", self.compute()), "new")
+        self.assertEqual(cache.get("key")["value"], "new")
+        self.assertIsNone(cache.get("key:lock"))
+
+    def test_stale_value_is_served_while_locked(self):
+        cache.set("key", {"value": "old", "fresh_until": 0})
+        cache.add("key:lock", 1)
+
+        self.assertEqual(get_or_compute("key", self.compute()), "old")
+        self.assertEqual(self.calls, 0)
+
+    def test_miss_waits_for_the_lock_holder(self):
+        cache.add("key:lock", 1)
+
+        def finish_refresh():
+            time.sleep(0.1)
+            cache.set("key", {"value": "theirs", "fresh_until": time.time() + 60})
+
+        threading.Thread(target=finish_refresh).start()
+        self.assertEqual(get_or_compute("key", self.compute()), "theirs")
+        self.assertEqual(self.calls, 0)
+
+    def test_miss_computes_when_the_lock_holder_stores_nothing(self):
+        cache.add("key:lock", 1)
+        threading.Timer(0.1, cache.delete, ["key:lock"]).start()
+
+        with mock.patch.object(catalog_cache, "REFRESH_WAIT", 1):
+            started = time.monotonic()
+            self.assertEqual(get_or_compute("key", self.compute()), "new")
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_miss_computes_after_waiting_too_long(self):
+        cache.add("key:lock", 1)
+
+        with mock.patch.object(catalog_cache, "REFRESH_WAIT", 0.1):
+            self.assertEqual(get_or_compute("key", self.compute()), "new")
+        self.assertEqual(self.calls, 1)
+        # The lock still belongs to its holder
+        self.assertEqual(cache.get("key:lock"), 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Tests the in-process coalescing of identical concurrent calls.
+    """
+
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "done"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("key", slow))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["done"] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.calls, {})
+
+    def test_exception_is_raised_and_forgotten(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertRaisesMessage(RuntimeError, "boom"):
+            flight.do("key", fail)
+        self.assertEqual(flight.do("key", lambda: "retried"), "retried")
+
+
+def response(status, headers=None):
+    """
+    Builds a requests Response with a status code and headers.
+    """
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers or {})
+    result._content = b"[]"
+    return result
+
+
+class IGDBClientTests(SimpleTestCase):
+    """
+    Tests the retry, Retry-After and backoff handling of the IGDB client.
+    """
+
+    def setUp(self):
+        self.client = IGDBClient(retries=2)
+        self.client.session.post = mock.Mock()
+        self.client.backoff_delay = mock.Mock(return_value=0.5)
+
+        # Retries sleep and print, neither is wanted in a test run
+        self.sleep = self.enterContext(mock.patch.object(igdb.time, "sleep"))
+        self.print = self.enterContext(mock.patch("builtins.print"))
+
+    def post(self, data="fields name;"):
+        return self.client.post(igdb.IGDB_GAMES_URL, data, limited=False)
+
+    def test_success(self):
+        self.client.session.post.return_value = response(200)
+
+        self.assertEqual(self.post().status_code, 200)
+        self.sleep.assert_not_called()
+
+    def test_429_waits_for_retry_after(self):
+        self.client.session.post.side_effect = [response(429, {"Retry-After": "7"}), response(200)]
+
+        self.assertEqual(self.post().status_code, 200)
+        self.sleep.assert_called_once_with(7.0)
+
+    def test_retry_after_shorter_than_backoff(self):
+        self.client.session.post.side_effect = [response(429, {"Retry-After": "0"}), response(200)]
+
+        self.post()
+        self.sleep.assert_called_once_with(0.5)
+
+    def test_other_4xx_raises_at_once(self):
+        self.client.session.post.return_value = response(400)
+
+        with self.assertRaisesMessage(IGDBError, "returned 400"):
+            self.post()
+        self.assertEqual(self.client.session.post.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_5xx_and_connection_errors_are_retried_then_given_up(self):
+        self.client.session.post.side_effect = [
+            response(503),
+            requests.exceptions.ConnectionError("reset"),
+            response(502),
+        ]
+
+        with self.assertRaisesMessage(IGDBError, "after 3 attempts"):
+            self.post()
+        self.assertEqual(self.client.session.post.call_count, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+        self.client.backoff_delay.assert_has_calls([mock.call(0), mock.call(1)])
+
+    def test_5xx_recovers(self):
+        self.client.session.post.side_effect = [response(500), response(200)]
+
+        self.assertEqual(self.post().status_code, 200)
+
+    def test_backoff_is_capped(self):
+        client = IGDBClient(backoff=1.0, max_backoff=4.0)
+
+        for attempt in range(10):
+            self.assertLessEqual(client.backoff_delay(attempt), 4.0)
+
+    def test_form_bodies_stay_out_of_errors_and_logs(self):
+        secret = {"client_id": "id", "client_secret": "s3cret", "grant_type": "client_credentials"}
+
+        self.client.session.post.side_effect = [response(503), response(503), response(503)]
+        with self.assertRaises(IGDBError) as raised:
+            self.post(secret)
+        self.assertNotIn("s3cret", str(raised.exception))
+
+        self.client.session.post.side_effect = [response(401)]
+        with self.assertRaises(IGDBError) as raised:
+            self.post(secret)
+        self.assertNotIn("s3cret", str(raised.exception))
+
+        printed = " ".join(str(call) for call in self.print.call_args_list)
+        self.assertTrue(printed)
+        self.assertNotIn("s3cret", printed)
+
+    def test_query_bodies_are_described(self):
+        self.client.session.post.return_value = response(400)
+
+        with self.assertRaisesMessage(IGDBError, "fields name;"):
+            self.post()
+
+
+class UnpackMultiqueryTests(SimpleTestCase):
+    """
+    Tests splitting a multiquery response back into /games pages.
+    """
+
+    def test_pages_in_offset_order_with_expanded_genres(self):
+        genre_names = {}
+        results = {
+            "genres": [{"id": 1, "name": "Shooter"}, {"id": 2, "name": "Puzzle"}],
+            "1000": [{"id": 12, "genres": [2]}],
+            "500": [{"id": 11, "genres": [1, 2, 99]}, {"id": 13}],
+        }
+
+        pages = unpack_multiquery(results, [500, 1000, 1500], genre_names)
+
+        self.assertEqual(pages, [
+            [
+                {"id": 11, "genres": [{"id": 1, "name": "Shooter"}, {"id": 2, "name": "Puzzle"}]},
+                {"id": 13, "genres": []},
+            ],
+            [{"id": 12, "genres": [{"id": 2, "name": "Puzzle"}]}],
+            [],
+        ])
+        self.assertEqual(genre_names, {1: "Shooter", 2: "Puzzle"})
+
+    def test_genre_names_carry_over_between_requests(self):
+        genre_names = {3: "Racing"}
+
+        pages = unpack_multiquery({"0": [{"id": 1, "genres": [3]}]}, [0], genre_names)
+
+        self.assertEqual(pages, [[{"id": 1, "genres": [{"id": 3, "name": "Racing"}]}]])
+
+
+class DumpTests(SimpleTestCase):
+    """
+    Tests recording pages to a dump and replaying them.
+    """
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def record(self, pages):
+        return list(record_pages([json.dumps(page).encode() for page in pages], self.directory))
+
+    def replay(self):
+        return [json.loads(content) for content in read_dump_pages(self.directory)]
+
+    def test_round_trip(self):
+        pages = [
+            [{"id": 1, "name": "Tab\there", "summary": "Two\nlines"}, {"id": 2, "name": "Pokémon"}],
+            [],
+            [{"id": 3, "name": "Last"}],
+        ]
+
+        recorded = self.record(pages)
+
+        self.assertEqual([json.loads(content) for content in recorded], pages)
+        self.assertEqual(self.replay(), pages)
+
+    def test_recording_again_appends(self):
+        self.record([[{"id": 1}], [{"id": 2}]])
+        self.record([[{"id": 3}]])
+
+        self.assertEqual(self.replay(), [[{"id": 1}], [{"id": 2}], [{"id": 3}]])
+        self.assertEqual(len(os.listdir(self.directory)), 3)
+
+
+class CopyValueTests(SimpleTestCase):
+    """
+    Tests formatting values for PostgreSQL's COPY text format.
+    """
+
+    def test_null(self):
+        self.assertEqual(copy_value(None), "\\N")
+
+    def test_special_characters_are_escaped(self):
+        self.assertEqual(copy_value("a\tb"), "a\\tb")
+        self.assertEqual(copy_value("a\nb\r\nc"), "a\\nb\\r\\nc")
+        self.assertEqual(copy_value("C:\\games"), "C:\\\\games")
+        # A literal backslash before an n or N must not read back as a newline or NULL
+        self.assertEqual(copy_value("\\n"), "\\\\n")
+        self.assertEqual(copy_value("\\N"), "\\\\N")
+
+    def test_other_values(self):
+        release = datetime.datetime(2020, 5, 1, tzinfo=datetime.timezone.utc)
+
+        self.assertEqual(copy_value(release), "2020-05-01T00:00:00+00:00")
+        self.assertEqual(copy_value(4.5), "4.5")
+        self.assertEqual(copy_value("Pokémon"), "Pokémon")
+
+    def test_stream_reads_the_same_in_any_chunk_size(self):
+        rows = [(1, "Tab\there", None), (2, "Two\nlines", "x" * 50)]
+        expected = "1\tTab\\there\t\\N\n2\tTwo\\nlines\t" + "x" * 50 + "\n"
+
+        self.assertEqual(CopyStream(rows).read(), expected)
+
+        stream = CopyStream(rows)
+        chunks = iter(lambda: stream.read(7), "")
+        self.assertEqual("".join(chunks), expected)
+
+
+class PipelineTests(SimpleTestCase):
+    """
+    Tests how the ingestion pipeline passes items, errors and stops along.
+    """
+
+    def setUp(self):
+        self.pipeline = Pipeline(depth=2)
+        self.received = []
+
+    def test_items_pass_in_order(self):
+        items = self.pipeline.source("source", range(50))
+        doubled = self.pipeline.stage("double", lambda item: item * 2, items)
+        self.pipeline.sink("sink", self.received.append, doubled)
+
+        self.assertEqual(self.received, [item * 2 for item in range(50)])
+        self.assertEqual([stats.items for stats in self.pipeline.stats], [50, 50, 50])
+
+    def test_source_error_after_the_produced_items(self):
+        def pages():
+            yield from range(5)
+            raise ValueError("IGDB is down")
+
+        items = self.pipeline.source("source", pages())
+        with self.assertRaisesMessage(ValueError, "IGDB is down"):
+            self.pipeline.sink("sink", self.received.append, items)
+
+        self.assertEqual(self.received, list(range(5)))
+
+    def test_stage_error_stops_the_pipeline(self):
+        def transform(item):
+            if item == 3:
+                raise ValueError("Bad page")
+            return item
+
+        # The endless source only ends because the failed stage stops it
+        items = self.pipeline.source("source", itertools.count())
+        results = self.pipeline.stage("transform", transform, items)
+        with self.assertRaisesMessage(ValueError, "Bad page"):
+            self.pipeline.sink("sink", self.received.append, results)
+
+        self.assertEqual(self.received, [0, 1, 2])
+        self.assertFalse(any(thread.is_alive() for thread in self.pipeline.threads))
+
+    def test_sink_error_stops_the_pipeline(self):
+        def write(item):
+            raise ValueError("Database is down")
+
+        items = self.pipeline.source("source", itertools.count())
+        with self.assertRaisesMessage(ValueError, "Database is down"):
+            self.pipeline.sink("sink", write, items)
+
+        self.assertFalse(any(thread.is_alive() for thread in self.pipeline.threads))
@@ -1,253 +1,358 @@
-import os
-from .models import Token, Game, Video, Screenshot, Genre
-from datetime import timedelta
+from .models import Game, IngestionRun, SEARCH_CONFIG
 from django.utils import timezone
-from django.utils.timezone import make_aware
-from requests import post
-from django.db import transaction
-import time
-from django.utils.text import slugify
-from django.db.models import F
-from django.core.paginator import Paginator
-from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, connections
+from django.db.models import Max, Sum
 from django.db.models import Q
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
-from django.core.cache import cache
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from .serializer import GetGamesSerializer
-import requests
-import hashlib
+from .cache import catalog_key, get_game_cards, get_or_compute
+from .suggestions import get_suggestion_index
+from .search import count_game_list, count_genres, fuzzy_search, search_game_ids, seek_game_page, MAX_PAGES, SEEK_ORDERS
+from .igdb import (
+    fetch_game_pages, fetch_genre_names, fetch_max_game_id, record_pages, read_dump_pages,
+    IGDBClient, IGDBError, SharedTokenBucket, DEFAULT_CONCURRENCY,
+)
+from .ingestion import GameWriter, CopyGameWriter, GenreResolver, Pipeline, transform_page
+from .metrics import IngestionMetrics, dump_profile
+from functools import partial
+import cProfile
+import logging
+import multiprocessing
 
 
-download_batch_size = 500
-CACHE_TIMEOUT = 3600
-BATCH_SIZE = 10000
+logger = logging.getLogger(__name__)
 
 
-def add_or_refresh_token(data):
+# Seconds a delta sync reaches back before the previous run's high water mark
+SYNC_OVERLAP = 300
+
+
+def loadGames(concurrency=DEFAULT_CONCURRENCY, delta=False, method="orm", resume=False, record_to=None, from_dump=None, pages_per_request=1, profile=None, workers=1):
     """
-    Adds new or refreshed token to the database
+    Fetches games from IGDB and upserts them into the database.
+
+    A full import asks IGDB for every game with an id above the highest one
+    already stored. A delta import asks only for games whose `updated_at` is
+    newer than the high water mark of the last finished run. Either way games
+    are upserted on game_id, so changed ratings, summaries, media and genres
+    replace the stored ones.
+
+    Every committed batch checkpoints the run's highest written IGDB id. With
+    `resume` the latest unfinished run is continued with its original filter
+    from right after that id, so an import killed by a deploy or the OOM
+    killer does not redo any committed work.
+
+    With `workers` above 1 the IGDB id range of the run is split into that
+    many shards, each imported by its own process so transforming and writing
+    use several cores. The processes share one rate limiter and every shard
+    checkpoints on its own, so resuming a sharded run only restarts the
+    shards that did not finish.
+
+    Pages can be recorded to a dump directory while importing and a dump
+    replayed later with `from_dump`, which runs the same transform and insert
+    path without IGDB credentials or network, e.g. to benchmark writers on
+    identical data.
+
+    Ingestion runs as a pipeline of three concurrent stages connected by
+    bounded queues:
+        fetch: `fetch_game_pages` keeps up to `concurrency` requests in flight
+            while staying inside IGDB's rate limit, each fetching
+            `pages_per_request` pages through /multiquery when above 1.
+        transform: decodes each page and builds the game records.
+        write: upserts the records in batches of 10,000 games, through the
+            ORM (`GameWriter`) or with COPY into staging tables (`CopyGameWriter`).
+    A slow stage makes the ones before it wait, so memory stays capped by the
+    queue depths however large the catalog is.
+
+    Every batch prints the time spent on HTTP, JSON decoding, transforming,
+    game inserts, genre links and media, and the run ends with a summary
+    table with rows/sec and peak memory.
 
     Parameters:
-        data: the data returned from a request to twitch igdb
+        concurrency (int): How many IGDB pages may be fetched at once, split between the workers.
+        delta (bool): Only fetch games updated since the last finished run, every game if there is none.
+        method (str): "orm" for multi-row INSERTs or "copy" for the COPY bulk loader.
+        resume (bool): Continue the latest unfinished run instead of starting a new one.
+        record_to (str): Directory the fetched pages are also saved to as gzip NDJSON.
+        from_dump (str): Directory of a recorded dump to import instead of fetching from IGDB.
+        pages_per_request (int): How many 500-game pages each IGDB request packs.
+        profile (str): Path of a cProfile dump of every ingestion thread to write at the end.
+        workers (int): How many processes import shards of a new run.
     """
-    access_token = data.get("access_token")
-    expires_in = data.get("expires_in")
-    token_type = data.get("token_type")
-    expires_in = timezone.now() + timedelta(seconds=expires_in)
+    metrics = IngestionMetrics()
+
+    if from_dump:
+        # Replays never touch IGDB or the run history, so they cannot move
+        # the high water mark of the next delta sync
+        return write_pages(read_dump_pages(from_dump), None, method, metrics, profile)
+
+    if resume:
+        run = IngestionRun.objects.filter(
+            finished_at__isnull=True, parent__isnull=True
+        ).order_by("-started_at").first()
+        if run is None:
+            return "No unfinished import to resume"
+        print(f"Resuming {run}, {run.games_loaded} games already loaded")
+    else:
+        run = start_ingestion_run(delta)
+
+    # A resumed run keeps the layout it was started with
+    if run.shards.exists() or (workers > 1 and not resume):
+        return import_shards(run, workers, concurrency, method, pages_per_request)
 
-    token = Token(access_token=access_token, expires_in=expires_in, token_type=token_type)
-    token.save()
-    return token
+    source = fetch_game_pages(
+        concurrency=concurrency,
+        where=run_filter(run),
+        pages_per_request=pages_per_request,
+        metrics=metrics,
+    )
+    if record_to:
+        source = record_pages(source, record_to)
 
-    
+    return write_pages(source, run, method, metrics, profile)
 
-def authenticate():
+
+def write_pages(source, run, method, metrics, profile=None):
     """
-    Gets a token from twitch for the igdb or refreshes the current token
+    Transforms and writes the pages of `source` through the ingestion pipeline.
+
+    Parameters:
+        source (iterable): The pages to import, raw or decoded.
+        run (IngestionRun): The run checkpointed by every batch, None for replays.
+        method (str): "orm" or "copy", see `loadGames`.
+        metrics (IngestionMetrics): Collector the stage timings are added to.
+        profile (str): Optional path of a cProfile dump to write at the end.
+
+    Returns:
+        str: A summary of the import.
     """
-    token = Token.objects.all()
-    # Checks if there is already a token
-    if len(token) > 0:
-        token = token[0]
-        # Checks if the token is expired and refreshes it if it is
-        if token.expires_in <= timezone.now():
-            
-            # Sends a request for a new token
-            response = post("https://id.twitch.tv/oauth2/token", data={
-                "client_id": os.getenv("CLIENT_ID"),
-                "client_secret": os.getenv("CLIENT_SECRET"),
-                "grant_type": "client_credentials"
-            }).json()
-            
-            return add_or_refresh_token(response)
+    profilers = [] if profile else None
+    writer = CopyGameWriter(run=run, metrics=metrics) if method == "copy" else GameWriter(run=run, metrics=metrics)
+    pipeline = Pipeline(profilers=profilers)
 
+    def write(records):
+        if writer.add(records):
+            print(pipeline.status())
 
-    else:
-        # Sends a request for a token
-        response = post("https://id.twitch.tv/oauth2/token", data={
-                "client_id": os.getenv("CLIENT_ID"),
-                "client_secret": os.getenv("CLIENT_SECRET"),
-                "grant_type": "client_credentials"
-            }).json()
-        
-        return add_or_refresh_token(response)
+    # The pipeline threads profile themselves, the writer runs on this one
+    if profile:
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        profiler.enable()
 
+    pages = pipeline.source("fetch", source)
+    records = pipeline.stage("transform", partial(transform_page, metrics=metrics), pages)
 
-def bulk_create_in_batches(model_class, objects, batch_size=download_batch_size):
+    finished = True
+    try:
+        pipeline.sink("write", write, records)
+    except IGDBError as e:
+        print(f"Import stopped early: {e}")
+
+        # Keeps the games fetched so far, the run stays unfinished so it can
+        # be resumed and its high water mark is not used by the next delta sync
+        finished = False
+
+    # Insert any remaining games
+    writer.finish()
+
+    if profile:
+        profiler.disable()
+
+    print(pipeline.report())
+    print(metrics.report())
+
+    if profile:
+        dump_profile(profilers, profile)
+
+    if not finished:
+        return f"{writer.games_written} Games Loaded, import incomplete"
+
+    if run:
+        run.finished_at = timezone.now()
+        run.save(update_fields=["finished_at"])
+
+    return f"{writer.games_written} Games Loaded Successfully!"
+
+
+def run_filter(run):
+    """
+    Returns the IGDB filter of a run, narrowed to the games after its last checkpoint.
+    """
+    where = run.query_filter
+    if run.last_game_id is not None:
+        where = f"({where}) & id > {run.last_game_id}" if where else f"id > {run.last_game_id}"
+    return where or None
+
+
+def import_shards(run, workers, concurrency, method, pages_per_request):
     """
-    Efficiently bulk-create objects in smaller batches to avoid memory overload.
+    Imports a run with one process per shard of its IGDB id range.
+
+    The shards are created on the first call. When resuming, only the
+    unfinished shards are started again, each from its own checkpoint.
 
     Parameters:
-        model_class (models.Model): The Django model class (e.g., Game, Genre) whose instances are being created.
-        objects (list): A list of unsaved model instances (objects of model_class) to be inserted into the database.
-        batch_size (int): The number of objects to create in each batch. Defaults to 'download_batch_size'.
-
-    Example:
-        Example:
-        games = [Game(title="Game 1", ...), Game(title="Game 2", ...)]
-        bulk_create_in_batches(Game, games)
+        run (IngestionRun): The parent run.
+        workers (int): How many shards a new run is split into.
+        concurrency (int): IGDB requests in flight across all shards.
+        method (str): "orm" or "copy", see `loadGames`.
+        pages_per_request (int): How many pages each IGDB request packs.
+
+    Returns:
+        str: A summary of the import.
     """
-    for i in range(0, len(objects), batch_size):
-        model_class.objects.bulk_create(objects[i:i + batch_size])
+    limiter = SharedTokenBucket()
+
+    if not run.shards.exists():
+        client = IGDBClient(limiter=limiter)
+        create_shards(run, workers, client)
+
+        # Genres are not unique in the database, so they are created once
+        # here rather than by several shards racing on the same new name
+        GenreResolver().resolve(fetch_genre_names(client))
+
+    shards = list(run.shards.filter(finished_at__isnull=True).order_by("pk"))
+
+    # Forked processes would otherwise share this process's connection
+    connections.close_all()
+
+    context = multiprocessing.get_context("fork")
+    per_shard = max(1, concurrency // max(1, len(shards)))
+    processes = [
+        context.Process(
+            target=import_shard,
+            args=(shard.pk, limiter, per_shard, method, pages_per_request),
+            name=f"shard-{shard.pk}",
+        )
+        for shard in shards
+    ]
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        if process.exitcode:
+            print(f"{process.name} exited with code {process.exitcode}")
+
+    run.games_loaded = run.shards.aggregate(Sum("games_loaded"))["games_loaded__sum"] or 0
+    unfinished = run.shards.filter(finished_at__isnull=True).count()
+
+    if unfinished:
+        run.save(update_fields=["games_loaded"])
+        return f"{run.games_loaded} Games Loaded, {unfinished} of {run.shards.count()} shards incomplete"
+
+    run.finished_at = timezone.now()
+    run.save(update_fields=["games_loaded", "finished_at"])
+    return f"{run.games_loaded} Games Loaded Successfully!"
+
+
+def create_shards(run, workers, client):
+    """
+    Splits the IGDB id range of a run into `workers` child runs of equal width.
+
+    The range runs from the highest stored game id for full imports (0 for
+    delta syncs) to the highest IGDB id matching the run's filter. The last
+    shard has no upper bound, so games IGDB adds during the import are not
+    missed.
+    """
+    high = fetch_max_game_id(client, run.query_filter or None)
+    if high is None:
+        return
+
+    low = 0
+    if run.mode == "full":
+        low = Game.objects.aggregate(Max("game_id"))["game_id__max"] or 0
+    width = max(1, -(-(high - low) // workers))
+
+    shards = []
+    for lower in range(low, high, width):
+        bounds = [f"id > {lower}"]
+        if lower + width < high:
+            bounds.append(f"id <= {lower + width}")
+
+        query_filter = " & ".join(([f"({run.query_filter})"] if run.query_filter else []) + bounds)
+        shards.append(IngestionRun(mode=run.mode, parent=run, started_at=run.started_at, query_filter=query_filter))
+
+    IngestionRun.objects.bulk_create(shards)
+
+
+def import_shard(run_id, limiter, concurrency, method, pages_per_request):
+    """
+    Imports one shard of a sharded run, runs in its own process.
+    """
+    try:
+        run = IngestionRun.objects.get(pk=run_id)
+        metrics = IngestionMetrics()
+        source = fetch_game_pages(
+            IGDBClient(limiter=limiter, pool_size=concurrency),
+            concurrency=concurrency,
+            where=run_filter(run),
+            pages_per_request=pages_per_request,
+            metrics=metrics,
+        )
+        print(f"Shard {run_id}: {write_pages(source, run, method, metrics)}")
+    finally:
+        connections.close_all()
 
 
-def loadGames():
+def start_ingestion_run(delta=False):
     """
-    Fetches games from IGDB in batches of 500 and stores them temporarily in memory.
+    Creates the IngestionRun of a new import along with the IGDB filter it fetches with.
 
-    Once 10,000 games have been collected, they are bulk created in the database
-    using the `bulk_create_in_batches` function to minimize database hits and improve performance.
+    Parameters:
+        delta (bool): Only fetch games updated since the last finished run
+            that covered every game. When there is none, e.g. on a catalog
+            filled before runs were recorded, every game is fetched and
+            upserted once, giving later delta runs their starting point.
 
-    After each bulk insert, the in-memory list is cleared to avoid RAM overuse.
+    Returns:
+        IngestionRun: The saved run.
     """
-    token = Token.objects.all()
+    run = IngestionRun(mode="delta" if delta else "full")
+
+    if delta:
+        high_water_mark = IngestionRun.objects.filter(
+            finished_at__isnull=False
+        ).aggregate(Max("high_water_mark"))["high_water_mark__max"]
+
+        if high_water_mark is None:
+            logger.warning("No finished run with a high water mark, this delta run fetches every game")
 
-    # Checks to see if there is a valid token else it gets a new one
-    if len(token) > 0 and token[0].expires_in > timezone.now():
-        token = token[0]
+    # Delta runs overlap the previous run slightly to absorb clock skew,
+    # full runs continue after the highest game id already stored
+    if run.mode == "delta":
+        run.query_filter = f"updated_at > {high_water_mark - SYNC_OVERLAP}" if high_water_mark else ""
     else:
-        token = authenticate()
+        last_game_id = Game.objects.aggregate(Max("game_id"))["game_id__max"]
+        run.query_filter = f"id > {last_game_id}" if last_game_id else ""
 
-    headers = {
-        "Client-ID": os.getenv("CLIENT_ID"),
-        "Authorization": f"Bearer {token.access_token}",
-    }
+    # Anything IGDB changes after this run starts is picked up by the next
+    # delta. A full run continuing after the stored ids refreshes none of
+    # the existing games, so it must not move the mark past their updates
+    if run.mode == "delta" or not run.query_filter:
+        run.high_water_mark = int(run.started_at.timestamp())
+    run.save()
+    return run
 
-    games = Game.objects.all()
-   
-    params = {
-        "fields": "id, name, first_release_date, storyline, summary, cover.url, videos.video_id, screenshots.url, rating, genres.name, aggregated_rating",
-        "limit": 500,
-        "offset": games.count(),
-    }
-
-    genre_list = [genre.name for genre in Genre.objects.all()]
-    game_objects, video_objects, screenshot_objects = [], [], []
-    seen_game_ids = set(Game.objects.values_list('game_id', flat=True))
-
-    # Inserts stored instance models into the database then clears them from the memory
-    def insert_batch():
-        if not game_objects:
-            return
-
-        bulk_create_in_batches(Game, game_objects)
-
-        # Updates the search_vector field after Game objects have been created
-        Game.objects.update(search_vector=SearchVector('title'))
-
-        for game in game_objects:
-            game.genres.add(*[genre for genre in game._genres])
-
-        bulk_create_in_batches(Video, video_objects)
-        bulk_create_in_batches(Screenshot, screenshot_objects)
-
-        # Clear buffers
-        game_objects.clear()
-        video_objects.clear()
-        screenshot_objects.clear()
-
-    total_games_loaded = 0
-    retries, attempt = 3, 1
-
-    while True:
-        try:
-            response = post("https://api.igdb.com/v4/games", params=params, headers=headers)
-        except requests.exceptions.RequestException as e:
-            print(f"Request failed on attempt {attempt + 1}/{retries}: {e}")
-            time.sleep(2 * attempt)
-            attempt += 1
-            if attempt > retries:
-                break
-            continue
-
-        if response.ok:
-            response = response.json()
-
-            with transaction.atomic():
-                for game in response:
-                    game_id = game.get("id")
-                    title = game.get('name')[:149]
-                    release = game.get("first_release_date")
-                    genres_data = game.get("genres")
-                    videos = game.get("videos")
-                    screenshots = game.get("screenshots")
-                    cover = game.get("cover")
-                    storyline = game.get("storyline")[:6000] if game.get("storyline") else None
-                    summary = game.get("summary")[:6000] if game.get("summary") else None
-                    rating = game.get("rating")
-                    critic_rating = game.get("aggregated_rating")
-
-                    
-                    if game_id in seen_game_ids:
-                        continue
-
-                    seen_game_ids.add(game_id)
-
-                    # Cover processing
-                    cover = cover.get('url').replace('t_thumb', 't_cover_big') if cover else None
-
-                    # Timestamp conversion
-                    if release:
-                        try:
-                            release = timezone.make_aware(timezone.datetime.fromtimestamp(release))
-                        except:
-                            release = None
-
-                    # Rating fallback
-                    rating = round(rating / 10, 1) if rating else round(critic_rating / 10, 1) if critic_rating else None
-
-                    safe_title = title[:80]
-                    slug = slugify(f"{safe_title}-{game_id}")
-
-                    # Genre handling
-                    game_genres = []
-                    if genres_data:
-                        for genre in genres_data:
-                            name = genre.get("name")
-                            if name in genre_list:
-                                game_genres.append(Genre.objects.get(name=name))
-                            else:
-                                new_genre = Genre.objects.create(name=name)
-                                genre_list.append(name)
-                                game_genres.append(new_genre)
-
-                    # Game object
-                    game_obj = Game(game_id=game_id, title=title, cover_image=cover, release=release,
-                                    storyline=storyline, summary=summary, rating=rating, slug=slug)
-                    game_obj._genres = game_genres  # temporarily attach genres
-                    game_objects.append(game_obj)
-
-                    # Video objects
-                    if videos:
-                        for vid in videos:
-                            video_objects.append(Video(game=game_obj, src=f"https://www.youtube.com/embed/{vid.get('video_id')}"))
-
-                    # Screenshot objects
-                    if screenshots:
-                        for shot in screenshots:
-                            screenshot_objects.append(Screenshot(game=game_obj, src=shot.get("url")))
-
-                    total_games_loaded += 1
-
-                    # Flush every BATCH_SIZE
-                    if total_games_loaded % BATCH_SIZE == 0:
-                        insert_batch()
-                        print(f"{total_games_loaded} games inserted so far...")
-
-            params["offset"] += 500
-            print(f"Games Fetched: {params["offset"]}")
-            time.sleep(1)
-        else:
-            break
 
-    # Insert any remaining games
-    with transaction.atomic():
-        insert_batch()
+def refresh_materialized_view(view_name):
+    """
+    Recomputes a materialized view of the catalog, e.g. the leaderboards.
+
+    The refresh is CONCURRENTLY, so requests keep reading the previous rows
+    instead of waiting on its lock, which needs a unique index on the view.
+    Cached data read from the view is still under the current catalog
+    version, so callers bump it once their refreshes are done.
 
-    return f"{total_games_loaded} Games Loaded Successfully!"
+    Parameters:
+        view_name (str): The view's table name, e.g. Leaderboard._meta.db_table.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'REFRESH MATERIALIZED VIEW CONCURRENTLY "{view_name}"')
 
 
-def getGameList(search_word ,perPage, page, sort_option, genre):
+def getGameList(search_word ,perPage, page, sort_option, genre, genre_match="any"):
     """
     Retrieves a paginated and optionally filtered list of games based on search criteria.
 
@@ -256,14 +361,12 @@ def getGameList(search_word ,perPage, page, sort_option, genre):
         perPage (int): Number of games to return per page.
         page (int): The current page number.
         sort_option (str): The field to sort results by (e.g., rating, release date).
-        genre (str): Optional genre to filter games by.
+        genre (str): Optional genre, or comma separated genres, to filter games by.
+        genre_match (str): "any" to show games with one of the genres, "all" for games with all of them.
 
     Returns:
-        QuerySet: A list of games matching the criteria.
+        tuple: The serialized games of the page and the number of pages (at most 500).
     """
-    sort_options = ["relevance","name", "release(asc)","release(desc)", "rating"]
-    search_threshold = 0.2
-    
     # Ensures page number is valid
     try:
         page = int(page)
@@ -272,132 +375,122 @@ def getGameList(search_word ,perPage, page, sort_option, genre):
     except ValueError:
         page = 1
 
-    # Create a cache key based on the search parameters
-    cache_key = f"search_games{hashlib.md5(f'{search_word}_{genre}_{sort_option}_{page}_{perPage}'.encode()).hexdigest()}"
+    # The ordered ids of every game the list can show are cached once per
+    # search, so paging through it is a slice of that list. The key carries
+    # the catalog version, so an import or edit makes it stale at once
+    cache_key = catalog_key("search_ids", search_word, genre, genre_match, sort_option, perPage)
 
-    
-    cached_results = cache.get(cache_key)
+    # Only results with at least 20 games are cached. Concurrent misses of
+    # the same search share one query instead of all hitting the database
+    game_ids = get_or_compute(
+        cache_key,
+        lambda: search_game_ids(search_word, genre, sort_option, MAX_PAGES * perPage, genre_match),
+        cache_if=lambda game_ids: len(game_ids) >= 20,
+    )
 
-    # Returns cached results if they exist
-    if cached_results:
-        return cached_results["games_page"], cached_results["pages"]
-        
-    # Sets sort option to release(desc) if the current option is relevance
-    # and there is no search_word
-    if not search_word and sort_option == "relevance":
-        sort_option = "release(desc)"
+    # returns if no games were found with the search word
+    if not game_ids:
+        return [], 0
 
-    # Search using postgres full text search if it returns results
-    # else it uses a trigram similiarity search instead
-    if search_word:
-        search_query = SearchQuery(search_word)
+    # A page past the end shows the last page
+    pages = -(-len(game_ids) // perPage)
+    page = min(page, pages)
 
-        # Try full-text search first
-        fulltext_results = Game.objects.annotate(
-            rank=SearchRank('search_vector', search_query)
-        ).filter(
-            search_vector=search_query
-        )
-        fulltext_exists = fulltext_results.exists()
+    # Cards are cached per game and shared by every page showing them
+    return get_game_cards(game_ids[(page - 1) * perPage:page * perPage]), pages
 
-        if fulltext_exists:
-            games = fulltext_results
-            if (sort_option == "relevance"):
-                games = games.order_by("-rank")
-        else:
-            # Fallback to Trigram
-            trigram_results = Game.objects.annotate(
-                similarity=TrigramSimilarity('title', search_word)
-            ).filter(
-                similarity__gt=search_threshold
-            )
-
-            games = trigram_results
-            if (sort_option == "relevance"):
-                games = games.order_by("-similarity")
-    else:
-        games = Game.objects.all()
-        
-
-    games = games.only("game_id","slug","title", "cover_image", "release","rating")
-    
-    # Filters by games that contain the selected genre
-    if genre != "All":
-        try:
-            genre_obj = Genre.objects.get(name=genre)
-            games = games.filter(genres=genre_obj)
-        except Genre.DoesNotExist:
-            pass
+def getGenreCounts(search_word):
+    """
+    Retrieves the number of games matching a search per genre, for faceted filtering.
 
-    # returns if no games were found with the search word
-    if not games.exists():
-        return [], 0
+    The counts of a search are cached like its game ids, under the catalog
+    version. The unfiltered counts are shared by every list without a
+    search word, so after an import they are computed once and then served
+    from the cache.
 
-    # Applys sort to list if a sort was selected
-    if sort_option in sort_options:
-        if sort_option == "name":
-            games = games.order_by(F("title").asc())
-        elif sort_option == "release(asc)":
-            games = games.order_by(F('release').asc(nulls_last=True), F('title').asc())
-        elif sort_option == "release(desc)":
-            games =games.order_by(F('release').desc(nulls_last=True), F('title').asc())
-        elif sort_option == "rating":
-            games =games.order_by(F('rating').desc(nulls_last=True), F('title').asc())
-    else:
-       games = games.order_by(F('release').desc(nulls_last=True), F('title').asc())
-
-    cache_count_key = f"results_count_{hashlib.md5(f'{search_word}_{genre}'.encode()).hexdigest()}"
-    cached_count = cache.get(cache_count_key)
-    
-    # If game_count is greater then 100 the game_count gets cached
-    # to speed up search times
-    if cached_count is not None:
-        game_count = cached_count
-    else:
-        game_count = games.count()
-        if game_count > 100:
-            cache.set(cache_count_key, game_count, timeout=CACHE_TIMEOUT)
+    Parameters:
+        search_word (str): The keyword to search games by title, may be empty.
+
+    Returns:
+        dict: The number of matching games of each genre name.
+    """
+    return get_or_compute(catalog_key("genre_counts", search_word), lambda: count_genres(search_word))
 
-    p = Paginator(games, perPage)
-    p.count = game_count
+def getGameListPages(search_word, perPage, genre, genre_match="any"):
+    """
+    Retrieves the number of pages of a game list, for lists paged by cursor.
 
-    games_page = p.get_page(page)
-    pages = p.num_pages
+    The count is bounded at 500 pages and estimated or precomputed where
+    possible (see count_game_list), so it costs the same on any catalog size.
 
-    serializer = GetGamesSerializer(games_page, many=True)
-    serialized_games = serializer.data
-   
-    # Prepare the result to cache
-    result = {
-        'games_page': serialized_games,
-        'pages': pages
-    }
+    Parameters:
+        search_word (str): The keyword to search games by title.
+        perPage (int): Number of games per page.
+        genre (str): Optional genre, or comma separated genres, to filter games by.
+        genre_match (str): "any" to show games with one of the genres, "all" for games with all of them.
+
+    Returns:
+        int: The number of pages, at most 500.
+    """
+    count = get_or_compute(
+        catalog_key("list_count", search_word, genre, genre_match, perPage),
+        lambda: count_game_list(search_word, genre, MAX_PAGES * perPage, genre_match),
+    )
+    return -(-count // perPage)
+
+def getGameListByCursor(search_word, perPage, cursor, sort_option, genre, genre_match="any"):
+    """
+    Retrieves the page of games following a cursor, with keyset pagination.
+
+    Parameters:
+        search_word (str): The keyword to search games by title.
+        perPage (int): Number of games to return per page.
+        cursor (str): The cursor of the previous page, empty for the first page.
+        sort_option (str): "name", "release(asc)", "release(desc)" or "rating".
+            "relevance" is only accepted without a search word, as release(desc).
+        genre (str): Optional genre, or comma separated genres, to filter games by.
+        genre_match (str): "any" to show games with one of the genres, "all" for games with all of them.
+
+    Returns:
+        tuple: The serialized games of the page and the cursor of the next page (None on the last page).
+
+    Raises:
+        ValueError: If the sort can't be paginated by cursor or the cursor is invalid.
+    """
+    if not search_word and sort_option == "relevance":
+        sort_option = "release(desc)"
 
-    # Cache the result for future queries if results contain at least 20 games
-    if (game_count >= 20):
-        cache.set(cache_key, result, timeout=CACHE_TIMEOUT)
+    if sort_option not in SEEK_ORDERS:
+        raise ValueError(f"Sort {sort_option!r} does not support cursor pagination")
 
-    return result['games_page'], result['pages']
+    games, next_cursor = seek_game_page(search_word, genre, sort_option, cursor, perPage, genre_match)
+    return GetGamesSerializer(games, many=True).data, next_cursor
 
 def getSuggestionList(search_word):
     """
     Retrieves a list of game suggestions based on a search keyword.
 
-    The function uses a predefined threshold to find games that closely match
-    the provided search word.
+    Titles with a word starting with the search word are looked up in the
+    in-memory suggestion index, best rated first, without a database query.
+    Only when it has no match (or hasn't been built yet) does the search fall
+    back to SQL full-text and trigram search for fuzzy matches.
 
     Parameters:
         search_word (str): The keyword used to find similar game titles.
 
     Returns:
-        QuerySet: A list of max 5 games sorted by there rank or similarity.
+        list | QuerySet: A list of max 5 games sorted by there rating, rank or similarity.
     """
-    search_threshold = 0.2
+    index = get_suggestion_index()
+    if search_word and index is not None:
+        suggestions = index.search(search_word)
+        if suggestions:
+            return suggestions
 
     # Search using postgres full text search if it returns results
     # else it uses a trigram similiarity search instead
     if search_word:
-        search_query = SearchQuery(search_word)
+        search_query = SearchQuery(search_word, config=SEARCH_CONFIG)
 
         # Try full-text search first
         fulltext_results = Game.objects.annotate(
@@ -409,14 +502,8 @@ def getSuggestionList(search_word):
         if fulltext_results.exists():
             return fulltext_results
         else:
-            # Fallback to TrigramSimilarity
-            trigram_results = Game.objects.annotate(
-                similarity=TrigramSimilarity('title', search_word)
-            ).filter(
-                similarity__gt=search_threshold
-            ).order_by('-similarity')[:5]
-
-            return trigram_results
+            # Fallback to the 5 nearest titles from the trigram GiST index
+            return fuzzy_search(Game.objects.all(), search_word)[:5]
     else:
         return []
 
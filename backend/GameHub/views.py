@@ -13,8 +13,10 @@ from .serializer import (
     UserInfoSerializer,
     ViewUserInfoSerializer,
     )
-from .utils import getGameList, getSuggestionList
-from django.core.cache import cache
+from .utils import getGameList, getGameListByCursor, getGameListPages, getGenreCounts, getSuggestionList
+from .cache import catalog_key, get_or_compute
+from .search import GENRE_MATCHES
+from .leaderboards import get_leaderboard
 import re
 from django.contrib.auth import authenticate, login, logout
 from rest_framework.permissions import IsAuthenticated
@@ -40,16 +42,26 @@ class GetGameList(APIView):
             q (str): Search keyword to filter games by title.
             s (str): Sort option ('relevance', 'rating', 'release', etc.). Defaults to 'relevance'.
             page (str): Page number for pagination. Defaults to '1'.
-            g (str): Genre to filter games. Defaults to 'All'.
+            g (str): Genre, or comma separated genres, to filter games. Defaults to 'All'.
+            match (str): 'any' to show games with one of the genres (default), 'all' for games with every one.
+            cursor (str): Switches to cursor pagination, empty for the first page
+                and then the "next_cursor" of the previous response. Not
+                available for the relevance sort of a search.
+            facets (str): "true" to also return the number of results per genre.
 
         Returns:
             Response: JSON containing:
-                - "pages": total number of pages (max 500),
+                - "pages": total number of pages (max 500), counted up to the cap
+                  and estimated for unfiltered lists,
+                - "next_cursor": with a cursor, the cursor of the next page (null on the last page),
                 - "data": list of serialized game data,
-                - "genres": list of available game genres.
+                - "genres": list of available game genres,
+                - "genre_counts": with facets, the number of games matching the
+                  search in each genre (regardless of the selected genre).
 
         Responses:
             200 OK: Successfully returns games and genres.
+            400 Bad Request: Invalid cursor or a sort that can't be paginated by cursor.
             404 Not Found: No matching games found.
         """
         perPage = 40
@@ -58,9 +70,35 @@ class GetGameList(APIView):
         search_word = request.GET.get('q', '')
         page_num = request.GET.get('page', "1")
         genre_option = request.GET.get("g", "All")
+        cursor = request.GET.get("cursor")
+        genre_match = request.GET.get("match", "any")
+        facets = request.GET.get("facets", "false").lower() in ("true", "1")
 
         search_word = re.sub(r'-', ' ', search_word)
-        data, pages = getGameList(search_word,perPage, page_num, sort_option,genre_option)
+        if genre_match not in GENRE_MATCHES:
+            genre_match = "any"
+
+        # Cursor pagination seeks to the page instead of counting and skipping
+        # rows, so deep pages cost the same as the first one
+        if cursor is not None:
+            try:
+                data, next_cursor = getGameListByCursor(search_word, perPage, cursor, sort_option, genre_option, genre_match)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if not data:
+                return Response({"error": "No Games Found"}, status=status.HTTP_404_NOT_FOUND)
+            genres = GenreSerializer(Genre.objects.all().order_by("name"), many=True).data
+
+            pages = getGameListPages(search_word, perPage, genre_option, genre_match)
+
+            response = {"pages": pages, "next_cursor": next_cursor, "data": data, "genres": genres}
+            if facets:
+                response["genre_counts"] = getGenreCounts(search_word)
+
+            return Response(response, status=status.HTTP_200_OK)
+
+        data, pages = getGameList(search_word,perPage, page_num, sort_option,genre_option, genre_match)
 
         # Limits the amount of visible pages to the user to 500 pages
         if pages > 500:
@@ -70,7 +108,14 @@ class GetGameList(APIView):
             return Response({"error": "No Games Found"}, status=status.HTTP_404_NOT_FOUND)
         genres = GenreSerializer(Genre.objects.all().order_by("name"), many=True).data
 
-        return Response({"pages": pages, "data":data, "genres":genres}, status=status.HTTP_200_OK)
+        response = {"pages": pages, "data":data, "genres":genres}
+
+        # Counts for every genre come from one grouped query over the
+        # search's matches, instead of one list request per genre
+        if facets:
+            response["genre_counts"] = getGenreCounts(search_word)
+
+        return Response(response, status=status.HTTP_200_OK)
 
 
 class GetGame(APIView):
@@ -111,9 +156,16 @@ class GetTopRatedList(APIView):
     
     def get(self, request):
         """
-        Handles GET requests to retrieve a list of the top 20 highest-rated games.
+        Handles GET requests to retrieve a list of the top 20 highest-rated games,
+        overall, of a genre or of a release year.
+
+        The lists are read from the leaderboard materialized view, refreshed
+        after each import, so no request sorts the catalog. They are also
+        cached, the cache key carries the catalog version.
 
-        Utilizes caching to reduce database load. Cached data expires every 30 minutes.
+        Query Parameters:
+            g (str): Optional genre name, for the genre's leaderboard.
+            year (str): Optional release year, for the year's leaderboard.
 
         Returns:
             Response: JSON containing:
@@ -121,14 +173,32 @@ class GetTopRatedList(APIView):
 
         Responses:
             200 OK: Successfully returns the top-rated games list.
-        """
-        top_rated_cache = cache.get("top_rated_list")
-        if (top_rated_cache):
-            data = top_rated_cache
-        else:
-            games = Game.objects.filter(rating__isnull=False).order_by('-rating', 'title')[:20]
-            data = GetGameSerializer(games, many=True).data
-            cache.set("top_rated_list", data, timeout=1800)
+            400 Bad Request: Both g and year were given, or the year isn't a number.
+            404 Not Found: The genre doesn't exist.
+        """
+        genre_name = request.GET.get("g")
+        year = request.GET.get("year")
+
+        if genre_name and year:
+            return Response({"error": "Use either g or year"}, status=status.HTTP_400_BAD_REQUEST)
+
+        board, board_key = "all", 0
+        if genre_name:
+            genre = Genre.objects.filter(name=genre_name).first()
+            if genre is None:
+                return Response({"error": "Genre not found"}, status=status.HTTP_404_NOT_FOUND)
+            board, board_key = "genre", genre.id
+        elif year:
+            try:
+                board, board_key = "year", int(year)
+            except ValueError:
+                return Response({"error": "Invalid year"}, status=status.HTTP_400_BAD_REQUEST)
+
+        def load_top_rated():
+            return GetGameSerializer(get_leaderboard(board, board_key), many=True).data
+
+        # A refresh is done by one worker while the others serve the cached list
+        data = get_or_compute(catalog_key("top_rated_list", board, board_key), load_top_rated)
 
         return Response({"data": data}, status=status.HTTP_200_OK)
     
@@ -96,6 +96,11 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
 
+# Minimum pg_trgm similarity for a title to match a fuzzy search. Passed as
+# a startup option, so every session has it without an extra query and the
+# `%` operator, which can use the trigram indexes, applies it.
+TRIGRAM_SIMILARITY_THRESHOLD = 0.2
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -104,6 +109,9 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'mypassword'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        'OPTIONS': {
+            'options': f'-c pg_trgm.similarity_threshold={TRIGRAM_SIMILARITY_THRESHOLD}',
+        },
     }
 }
 
@@ -152,6 +160,9 @@ STATIC_ROOT = "/app/static/"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = "/app/media/"
 
+# Title suggestion index rebuilt by load_games and memory-mapped by every worker
+SUGGESTION_INDEX_PATH = os.getenv("SUGGESTION_INDEX_PATH", str(BASE_DIR / "suggestions.idx"))
+
 
 
 # Default primary key field type
@@ -1,6 +1,6 @@
 export type Game = {
   id: string;
-  game_id: string;
+  game_id: number;
   cover_image: string;
   title: string;
   rating: string;
@@ -20,7 +20,7 @@ export type VideoScreenshot = {
 };
 
 export type GameDetail = {
-  game_id: string;
+  game_id: number;
   cover_image: string;
   title: string;
   rating: number;